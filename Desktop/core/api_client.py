@@ -2,8 +2,15 @@
 
 import requests
 import json
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from pathlib import Path
+from urllib.parse import quote
+
+
+# Respuestas guardadas para revalidar con If-None-Match
+ETAG_CACHE_SIZE = 500
 
 
 class APIClient:
@@ -13,6 +20,12 @@ class APIClient:
         self.base_url = base_url.rstrip('/')
         self.session = requests.Session()
         self.auth_token = None
+        self._etag_cache: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+        self._etag_lock = threading.Lock()
+        # Renueva los tokens y devuelve el nuevo token de acceso (o None)
+        self.token_refresher: Optional[Callable[[], Optional[str]]] = None
+        # Canal WebSocket para consultas (core.lookup_channel.LookupChannel), si está disponible
+        self.lookup_channel = None
     
     def set_auth_token(self, token: str):
         """Establece el token de autenticación"""
@@ -30,9 +43,56 @@ class APIClient:
             
         print(f"[DEBUG] Headers finales: {dict(self.session.headers)}")
     
-    def get_identifier(self, rfid_id: str) -> Optional[Dict[str, Any]]:
+    def get_with_etag(self, url: str, parse: Callable[[requests.Response], Any],
+                      timeout: float = 10) -> Tuple[int, Any, requests.Response]:
+        """
+        GET condicional: si el servidor responde 304 se reutiliza el contenido guardado
+
+        Returns:
+            (status_code, contenido, response); un 304 se devuelve como 200
+            con el contenido ya procesado por 'parse'
+        """
+        with self._etag_lock:
+            cached = self._etag_cache.get(url)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+
+        response = self.session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            with self._etag_lock:
+                self._etag_cache[url] = cached
+                self._etag_cache.move_to_end(url)
+            return 200, cached[1], response
+        if response.status_code != 200:
+            return response.status_code, None, response
+
+        content = parse(response)
+        etag = response.headers.get('ETag')
+        if etag:
+            with self._etag_lock:
+                self._etag_cache[url] = (etag, content)
+                self._etag_cache.move_to_end(url)
+                while len(self._etag_cache) > ETAG_CACHE_SIZE:
+                    self._etag_cache.popitem(last=False)
+        return 200, content, response
+
+    def forget_identifiers(self, rfid_ids: Optional[List[str]] = None):
+        """
+        Descarta respuestas guardadas de identificadores
+
+        Sin 'rfid_ids' vacía toda la caché (p.ej. si se perdieron eventos del servidor)
+        """
+        with self._etag_lock:
+            if rfid_ids is None:
+                self._etag_cache.clear()
+                return
+            for rfid_id in rfid_ids:
+                self._etag_cache.pop(f"{self.base_url}/identifier/{rfid_id}", None)
+
+    def get_identifier(self, rfid_id: str, retry_on_401: bool = True) -> Optional[Dict[str, Any]]:
         """
         Busca un identificador por RFID
+
+        Si el token expiró, intenta renovarlo una vez y repite la consulta
         
         Returns:
             Dict con datos del identificador si existe, None si no existe
@@ -41,18 +101,27 @@ class APIClient:
         print(f"[DEBUG] rfid_id: {rfid_id}")
         print(f"[DEBUG] base_url: {self.base_url}")
         print(f"[DEBUG] Headers de sesión: {dict(self.session.headers)}")
+
+        # 🔥 CON EL CANAL ABIERTO, LA CONSULTA ES UN MENSAJE DE IDA Y UNO DE VUELTA
+        if self.lookup_channel is not None and self.lookup_channel.is_open:
+            from .lookup_channel import LookupChannelUnavailable
+            try:
+                result = self.lookup_channel.lookup(rfid_id)
+                print(f"[DEBUG] ✅ Respuesta por canal WebSocket - Datos: {result}")
+                return result
+            except LookupChannelUnavailable as e:
+                print(f"[DEBUG] ⚠️ {e} - consultando por HTTP")
         
         try:
             url = f"{self.base_url}/identifier/{rfid_id}"
             print(f"[DEBUG] URL completa: {url}")
             
             print(f"[DEBUG] Realizando petición GET...")
-            response = self.session.get(url, timeout=10)
+            status_code, result, response = self.get_with_etag(url, lambda r: r.json())
             print(f"[DEBUG] Status code: {response.status_code}")
             
-            if response.status_code == 200:
-                result = response.json()
-                print(f"[DEBUG] ✅ Respuesta 200 - Datos: {result}")
+            if status_code == 200:
+                print(f"[DEBUG] ✅ Respuesta {response.status_code} - Datos: {result}")
                 return result
             elif response.status_code == 404:
                 print(f"[DEBUG] ❌ Respuesta 404 - Tarjeta no encontrada")
@@ -60,6 +129,8 @@ class APIClient:
             elif response.status_code == 401:
                 print(f"[ERROR] ❌ Error 401 - No autorizado. ¿Token válido?")
                 print(f"[ERROR] Headers enviados: {dict(self.session.headers)}")
+                if retry_on_401 and self._refresh_auth_token():
+                    return self.get_identifier(rfid_id, retry_on_401=False)
                 raise Exception("No autorizado - Token inválido o expirado")
             else:
                 print(f"[DEBUG] ⚠️ Código de estado inesperado: {response.status_code}")
@@ -69,8 +140,125 @@ class APIClient:
         except requests.exceptions.RequestException as e:
             print(f"[ERROR] Error de conexión: {e}")
             raise Exception(f"Error de conexión al backend: {str(e)}")
-    
-    def create_identifier(self, rfid: str, name: str, access: bool = False, 
+
+    def _refresh_auth_token(self) -> bool:
+        """Renueva el token tras un 401; True si hay un token nuevo"""
+        if not self.token_refresher:
+            return False
+        new_token = self.token_refresher()
+        if not new_token:
+            return False
+        self.set_auth_token(new_token)
+        return True
+
+    def get_identifiers_bulk(self, rfid_ids: List[str]) -> Dict[str, Any]:
+        """
+        Busca varios identificadores por RFID en una sola petición
+
+        Returns:
+            Dict con 'found' (lista de identificadores) y 'missing' (RFIDs no registrados)
+        """
+        print(f"[DEBUG] === APIClient.get_identifiers_bulk() ===")
+        print(f"[DEBUG] Cantidad de RFIDs: {len(rfid_ids)}")
+
+        try:
+            url = f"{self.base_url}/identifiers/lookup"
+            response = self.session.post(url, json={'rfids': list(rfid_ids)}, timeout=30)
+            print(f"[DEBUG] Status code: {response.status_code}")
+
+            if response.status_code == 200:
+                result = response.json()
+                print(f"[DEBUG] ✅ Encontrados: {len(result['found'])}, faltantes: {len(result['missing'])}")
+                return result
+            elif response.status_code == 401:
+                print(f"[ERROR] ❌ Error 401 - No autorizado. ¿Token válido?")
+                raise Exception("No autorizado - Token inválido o expirado")
+            else:
+                print(f"[DEBUG] ⚠️ Código de estado inesperado: {response.status_code}")
+                print(f"[DEBUG] Contenido de respuesta: {response.text}")
+                response.raise_for_status()
+
+        except requests.exceptions.RequestException as e:
+            print(f"[ERROR] Error de conexión: {e}")
+            raise Exception(f"Error de conexión al backend: {str(e)}")
+
+    def get_passes(self, rfid: Optional[str] = None, name: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None,
+                   cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        Obtiene una página del historial de accesos del servidor
+
+        Args:
+            rfid: Filtrar por RFID
+            name: Filtrar por nombre (coincidencia parcial)
+            since: Fecha ISO inicial (inclusive)
+            until: Fecha ISO final (exclusiva)
+            cursor: 'next_cursor' de la página anterior
+            limit: Cantidad máxima de registros
+
+        Returns:
+            Dict con 'items' (más recientes primero) y 'next_cursor' (None en la última página)
+        """
+        params = {'limit': limit}
+        for key, value in (('rfid', rfid), ('name', name), ('since', since),
+                           ('until', until), ('cursor', cursor)):
+            if value:
+                params[key] = value
+
+        try:
+            response = self.session.get(f"{self.base_url}/passes", params=params, timeout=10)
+            print(f"[DEBUG] GET /passes - Status code: {response.status_code}")
+
+            if response.status_code == 200:
+                return response.json()
+            elif response.status_code == 401:
+                print(f"[ERROR] ❌ Error 401 - No autorizado. ¿Token válido?")
+                raise Exception("No autorizado - Token inválido o expirado")
+            else:
+                print(f"[DEBUG] Contenido de respuesta: {response.text}")
+                response.raise_for_status()
+
+        except requests.exceptions.RequestException as e:
+            print(f"[ERROR] Error de conexión: {e}")
+            raise Exception(f"Error de conexión al backend: {str(e)}")
+
+    def get_stats(self, day: Optional[str] = None, rfid: Optional[str] = None,
+                  retry_on_401: bool = True) -> Dict[str, Any]:
+        """
+        Obtiene los contadores de accesos precalculados por el servidor
+
+        Args:
+            day: Día en formato YYYY-MM-DD (por defecto hoy)
+            rfid: Incluir también los contadores de esta tarjeta
+
+        Returns:
+            Dict con 'total', 'today', 'hours' y 'card' ({'granted', 'denied'} cada uno)
+        """
+        params = {}
+        if day:
+            params['day'] = day
+        if rfid:
+            params['rfid'] = rfid
+
+        try:
+            response = self.session.get(f"{self.base_url}/stats", params=params, timeout=10)
+
+            if response.status_code == 200:
+                return response.json()
+            elif response.status_code == 401:
+                print(f"[ERROR] ❌ Error 401 - No autorizado. ¿Token válido?")
+                if retry_on_401 and self._refresh_auth_token():
+                    return self.get_stats(day, rfid, retry_on_401=False)
+                raise Exception("No autorizado - Token inválido o expirado")
+            else:
+                print(f"[DEBUG] Contenido de respuesta: {response.text}")
+                response.raise_for_status()
+
+        except requests.exceptions.RequestException as e:
+            print(f"[ERROR] Error de conexión: {e}")
+            raise Exception(f"Error de conexión al backend: {str(e)}")
+
+    def create_identifier(self, rfid: str, name: str, access: bool = False,
                          image_path: Optional[str] = None) -> Dict[str, Any]:
         """
         Crea un nuevo identificador
@@ -118,6 +306,9 @@ class APIClient:
                     print(f"[ERROR] Headers enviados: {dict(self.session.headers)}")
                     print(f"[ERROR] Response body: {response.text}")
                     raise Exception("No autorizado - Token inválido o expirado")
+                elif response.status_code == 409:
+                    print(f"[ERROR] ❌ Error 409 - La tarjeta ya está registrada")
+                    raise Exception(f"La tarjeta {rfid} ya está registrada")
                 else:
                     print(f"[ERROR] Error {response.status_code}: {response.text}")
                     response.raise_for_status()
@@ -138,6 +329,19 @@ class APIClient:
             else:
                 raise Exception(f"Error de conexión: {str(e)}")
     
+    def image_url(self, image_path: str, size: Optional[int] = None) -> str:
+        """
+        Construye la URL de una imagen del backend
+
+        Con 'size', pide la variante reducida (p.ej. 128px) en lugar del original
+        """
+        if size and image_path.startswith('/static/images/'):
+            filename = image_path.rsplit('/', 1)[-1]
+            return f"{self.base_url}/images/{quote(filename)}?size={size}"
+        if image_path.startswith('/'):
+            return f"{self.base_url}{image_path}"
+        return f"{self.base_url}/{image_path}"
+
     def test_connection(self) -> bool:
         """Prueba la conexión con el backend"""
         try:
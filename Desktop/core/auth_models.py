@@ -14,6 +14,8 @@ class UserData:
     token: Optional[str] = None
     id: Optional[int] = None  # 🔥 AGREGAR ESTE CAMPO
     is_active: Optional[bool] = True
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # Segundos de vida del token de acceso
     
     def __post_init__(self):
         """Validaciones post-inicialización"""
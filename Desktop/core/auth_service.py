@@ -1,10 +1,35 @@
 import requests
 import json
+import threading
 from typing import Optional, Tuple
-from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal
 from .auth_models import UserData, LoginCredentials, RegisterData
 
 
+# Renovar el token de acceso este tiempo antes de que expire
+REFRESH_MARGIN_SECONDS = 60
+# Espera antes de reintentar una renovación fallida por error de red
+REFRESH_RETRY_SECONDS = 30
+
+
+class TokenRefreshWorker(QThread):
+    """Worker para renovar los tokens en segundo plano"""
+
+    success = pyqtSignal(str)  # Nuevo token de acceso
+    error = pyqtSignal(str, bool)  # mensaje, ¿la sesión expiró?
+
+    def __init__(self, auth_service: "AuthService"):
+        super().__init__()
+        self.auth_service = auth_service
+
+    def run(self):
+        access_token, message, expired = self.auth_service.refresh_tokens()
+        if access_token:
+            self.success.emit(access_token)
+        else:
+            self.error.emit(message, expired)
+
+
 class AuthService(QObject):
     """Servicio para manejar autenticación con la API"""
     
@@ -13,12 +38,24 @@ class AuthService(QObject):
     login_error = pyqtSignal(str)
     register_success = pyqtSignal(UserData)
     register_error = pyqtSignal(str)
+    token_refreshed = pyqtSignal(str)  # Nuevo token de acceso
+    session_expired = pyqtSignal(str)
+    _tokens_updated = pyqtSignal(int)
     
     def __init__(self, api_base_url: str = "http://localhost:8000"):
         super().__init__()
         self.api_base_url = api_base_url.rstrip('/')
         self.access_token: Optional[str] = None
+        self.refresh_token: Optional[str] = None
         self.current_user: Optional[UserData] = None
+        self.refresh_worker: Optional[TokenRefreshWorker] = None
+        # Una sola renovación a la vez: el token de renovación rota en cada uso
+        self._refresh_lock = threading.Lock()
+
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.timeout.connect(self._refresh_in_background)
+        self._tokens_updated.connect(self._schedule_refresh)
     
     def login(self, credentials: LoginCredentials) -> Tuple[bool, str]:
         """
@@ -42,6 +79,7 @@ class AuthService(QObject):
             if response.status_code == 200:
                 token_data = response.json()
                 self.access_token = token_data['access_token']
+                self.refresh_token = token_data.get('refresh_token')
                 
                 # Usar los datos del usuario incluidos en la respuesta
                 if 'user_data' in token_data:
@@ -51,7 +89,10 @@ class AuthService(QObject):
                         username=user_info['name'],  # Tu backend usa 'name'
                         email="",  # No está incluido en la respuesta
                         is_active=True,  # Asumimos que está activo ya que puede hacer login
-                        is_admin=user_info['is_admin']
+                        is_admin=user_info['is_admin'],
+                        token=self.access_token,
+                        refresh_token=self.refresh_token,
+                        expires_in=token_data.get('expires_in')
                     )
                     self.current_user = user_data
                     self.login_success.emit(user_data)
@@ -63,7 +104,10 @@ class AuthService(QObject):
                         username=credentials.username,
                         email="",
                         is_active=True,
-                        is_admin=False
+                        is_admin=False,
+                        token=self.access_token,
+                        refresh_token=self.refresh_token,
+                        expires_in=token_data.get('expires_in')
                     )
                     self.current_user = basic_user
                     self.login_success.emit(basic_user)
@@ -176,9 +220,99 @@ class AuthService(QObject):
             error_msg = f"Error en registro/login automático: {str(e)}"
             return False, error_msg, None
     
+    def start_auto_refresh(self, user_data: UserData):
+        """Renueva el token de acceso en segundo plano antes de que expire"""
+        self.current_user = user_data
+        self.access_token = user_data.token
+        self.refresh_token = user_data.refresh_token
+        self._schedule_refresh(user_data.expires_in or 0)
+
+    def refresh_now(self) -> Optional[str]:
+        """
+        Renueva los tokens de forma síncrona (seguro desde cualquier hilo)
+        Returns: el nuevo token de acceso, o None si no se pudo renovar
+        """
+        access_token, message, _ = self.refresh_tokens()
+        if not access_token:
+            print(f"[ERROR] No se pudo renovar el token: {message}")
+        return access_token
+
+    def refresh_tokens(self) -> Tuple[Optional[str], str, bool]:
+        """
+        Renueva los tokens, una sola petición a la vez
+
+        Si otro hilo renovó mientras se esperaba el candado, se reutiliza su
+        resultado: reenviar el token ya rotado lo haría parecer robado.
+
+        Returns: (nuevo token de acceso o None, mensaje de error, ¿la sesión expiró?)
+        """
+        token_used = self.refresh_token
+        with self._refresh_lock:
+            if self.refresh_token != token_used:
+                print(f"[DEBUG] Token ya renovado por otro hilo, reutilizando")
+                if self.refresh_token:
+                    return self.access_token, "", False
+                return None, "Sesión cerrada", True
+            if not self.refresh_token:
+                return None, "Sin token de renovación", True
+
+            try:
+                response = requests.post(
+                    f"{self.api_base_url}/token/refresh",
+                    json={'refresh_token': self.refresh_token},
+                    timeout=10
+                )
+            except requests.exceptions.RequestException as e:
+                return None, f"Error de conexión: {str(e)}", False
+
+            if response.status_code != 200:
+                try:
+                    detail = response.json().get('detail', 'Error al renovar la sesión')
+                except ValueError:
+                    detail = f"Error {response.status_code} al renovar la sesión"
+                return None, detail, response.status_code == 401
+
+            # Dentro del candado, para que quien espera vea ya el token nuevo
+            self._apply_tokens(response.json())
+            return self.access_token, "", False
+
+    def _schedule_refresh(self, expires_in: int):
+        if not self.refresh_token or not expires_in:
+            return
+        delay = max(expires_in - REFRESH_MARGIN_SECONDS, expires_in // 2)
+        print(f"[DEBUG] Próxima renovación de token en {delay}s")
+        self._refresh_timer.start(delay * 1000)
+
+    def _refresh_in_background(self):
+        if not self.refresh_token or (self.refresh_worker and self.refresh_worker.isRunning()):
+            return
+        self.refresh_worker = TokenRefreshWorker(self)
+        self.refresh_worker.error.connect(self._on_refresh_error)
+        self.refresh_worker.start()
+
+    def _apply_tokens(self, token_data: dict):
+        self.access_token = token_data['access_token']
+        self.refresh_token = token_data.get('refresh_token', self.refresh_token)
+        if self.current_user:
+            self.current_user.token = self.access_token
+            self.current_user.refresh_token = self.refresh_token
+        self.token_refreshed.emit(self.access_token)
+        # El temporizador solo puede reprogramarse desde el hilo principal
+        self._tokens_updated.emit(token_data.get('expires_in') or 0)
+
+    def _on_refresh_error(self, message: str, expired: bool):
+        print(f"[ERROR] Error al renovar el token: {message}")
+        if expired:
+            self.refresh_token = None
+            self.session_expired.emit(message)
+        else:
+            self._refresh_timer.start(REFRESH_RETRY_SECONDS * 1000)
+
     def logout(self):
         """Cierra sesión"""
+        self._refresh_timer.stop()
         self.access_token = None
+        self.refresh_token = None
         self.current_user = None
     
     def is_authenticated(self) -> bool:
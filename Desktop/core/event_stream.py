@@ -0,0 +1,92 @@
+"""Worker para recibir eventos del servidor en tiempo real (Server-Sent Events)"""
+
+import json
+from PyQt6.QtCore import QThread, pyqtSignal
+
+
+# Espera entre reconexiones (segundos), duplicándose hasta el máximo
+RECONNECT_DELAY_SECONDS = 2
+RECONNECT_MAX_DELAY_SECONDS = 60
+# El servidor envía un keepalive cada 15s; sin datos en este tiempo se reconecta
+READ_TIMEOUT_SECONDS = 45
+
+
+class EventStreamWorker(QThread):
+    """Mantiene abierta la conexión a /events y emite cada evento recibido"""
+
+    event_received = pyqtSignal(str, dict)  # tipo, datos
+    connection_status = pyqtSignal(bool, str)
+
+    def __init__(self, api_client):
+        super().__init__()
+        self.api_client = api_client
+        self.running = False
+        self._response = None
+
+    def run(self):
+        self.running = True
+        delay = RECONNECT_DELAY_SECONDS
+        while self.running:
+            try:
+                self._listen()
+                delay = RECONNECT_DELAY_SECONDS
+            except Exception as e:
+                if not self.running:
+                    break
+                print(f"[DEBUG] Stream de eventos desconectado: {e}")
+                self.connection_status.emit(False, str(e))
+            # Lo que llegó mientras no había conexión se perdió
+            self.api_client.forget_identifiers()
+            self.msleep(int(delay * 1000))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY_SECONDS)
+
+    def _listen(self):
+        url = f"{self.api_client.base_url}/events"
+        with self.api_client.session.get(url, stream=True, timeout=(10, READ_TIMEOUT_SECONDS)) as response:
+            if response.status_code == 401 and self.api_client._refresh_auth_token():
+                return
+            response.raise_for_status()
+            self._response = response
+            self.connection_status.emit(True, "Recibiendo eventos del servidor")
+
+            event_type, data = None, []
+            for line in response.iter_lines(decode_unicode=True):
+                if not self.running:
+                    return
+                if line is None or line.startswith(':'):
+                    continue
+                if line == '':
+                    if event_type and data:
+                        self._dispatch(event_type, '\n'.join(data))
+                    event_type, data = None, []
+                elif line.startswith('event:'):
+                    event_type = line[6:].strip()
+                elif line.startswith('data:'):
+                    data.append(line[5:].strip())
+            raise Exception("El servidor cerró el stream de eventos")
+
+    def _dispatch(self, event_type: str, payload: str):
+        try:
+            data = json.loads(payload)
+        except json.JSONDecodeError:
+            print(f"[ERROR] Evento inválido: {payload}")
+            return
+
+        # 🔥 Invalidar antes de avisar a la interfaz, para que vuelva a consultar datos frescos
+        if event_type == 'invalidate':
+            self.api_client.forget_identifiers(data.get('rfids', []))
+        elif event_type == 'identifier':
+            self.api_client.forget_identifiers([data['identifier']['rfid']])
+        elif event_type == 'lagged':
+            self.api_client.forget_identifiers()
+        self.event_received.emit(event_type, data)
+
+    def stop(self):
+        """Detiene el worker cerrando la conexión abierta"""
+        self.running = False
+        if self._response is not None:
+            try:
+                self._response.close()
+            except Exception:
+                pass
+        self.wait(2000)
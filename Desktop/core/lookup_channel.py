@@ -0,0 +1,145 @@
+"""Canal WebSocket persistente para consultar identificadores sin abrir una petición HTTP por escaneo"""
+
+import itertools
+import json
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional
+
+from PyQt6.QtCore import QObject, QTimer, QUrl, pyqtSignal
+from PyQt6.QtNetwork import QNetworkRequest
+from PyQt6.QtWebSockets import QWebSocket
+
+
+# Tiempo máximo de espera de una respuesta antes de usar HTTP
+LOOKUP_TIMEOUT_SECONDS = 5
+# Espera antes de reconectar el canal (milisegundos)
+RECONNECT_DELAY_MS = 3000
+
+
+class LookupChannelUnavailable(Exception):
+    """El canal no está abierto o no respondió; la consulta debe hacerse por HTTP"""
+
+
+class LookupChannel(QObject):
+    """
+    Mantiene abierto /ws/lookup y correlaciona respuestas por 'id'
+
+    Vive en el hilo principal; 'lookup()' se llama desde los workers y
+    espera la respuesta sin bloquear la interfaz.
+    """
+
+    connection_changed = pyqtSignal(bool)
+    _send_requested = pyqtSignal(str)
+
+    def __init__(self, api_client):
+        super().__init__()
+        self.api_client = api_client
+        self.is_open = False
+        self._closing = False
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+        self.socket = QWebSocket()
+        self.socket.connected.connect(self._on_connected)
+        self.socket.disconnected.connect(self._on_disconnected)
+        self.socket.textMessageReceived.connect(self._on_message)
+        self.socket.errorOccurred.connect(self._on_error)
+        # Conexión en cola: los workers piden el envío y el socket escribe en su propio hilo
+        self._send_requested.connect(self.socket.sendTextMessage)
+
+        self.reconnect_timer = QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self.open)
+
+    def open(self):
+        """Abre el canal con el token actual del cliente"""
+        if not self.api_client.auth_token:
+            return
+        self._closing = False
+        url = self.api_client.base_url.replace('http', 'ws', 1) + '/ws/lookup'
+        request = QNetworkRequest(QUrl(url))
+        request.setRawHeader(b'Authorization', f'Bearer {self.api_client.auth_token}'.encode())
+        print(f"[DEBUG] Abriendo canal de consultas: {url}")
+        self.socket.open(request)
+
+    def reconnect(self, *args):
+        """Reabre el canal, p.ej. tras renovar el token"""
+        self.socket.close()
+        self.reconnect_timer.start(0)
+
+    def close(self):
+        self._closing = True
+        self.reconnect_timer.stop()
+        self.socket.close()
+
+    def lookup(self, rfid_id: str, timeout: float = LOOKUP_TIMEOUT_SECONDS) -> Optional[Dict[str, Any]]:
+        """
+        Busca un identificador por el canal abierto
+
+        Returns:
+            Dict con datos del identificador si existe, None si no existe
+
+        Raises:
+            LookupChannelUnavailable: si hay que repetir la consulta por HTTP
+        """
+        if not self.is_open:
+            raise LookupChannelUnavailable("Canal de consultas cerrado")
+
+        request_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            self._pending[request_id] = future
+        self._send_requested.emit(json.dumps({'id': request_id, 'rfid': rfid_id}))
+
+        try:
+            message = future.result(timeout)
+        except FutureTimeoutError:
+            raise LookupChannelUnavailable(f"Sin respuesta para {rfid_id}")
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+        if message['status'] == 200:
+            return message['identifier']
+        if message['status'] == 404:
+            return None
+        raise LookupChannelUnavailable(f"Error {message['status']} en el canal de consultas")
+
+    def _on_connected(self):
+        print(f"[DEBUG] ✅ Canal de consultas abierto")
+        self.is_open = True
+        self.connection_changed.emit(True)
+
+    def _on_disconnected(self):
+        print(f"[DEBUG] ⚠️ Canal de consultas cerrado: {self.socket.closeReason()}")
+        self.is_open = False
+        self.connection_changed.emit(False)
+
+        # Las consultas en curso se repiten por HTTP
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(LookupChannelUnavailable("Canal de consultas cerrado"))
+
+        if not self._closing:
+            self.reconnect_timer.start(RECONNECT_DELAY_MS)
+
+    def _on_error(self, error):
+        print(f"[ERROR] Canal de consultas: {self.socket.errorString()}")
+        # Un intento de conexión fallido no siempre emite 'disconnected'
+        if not self.is_open and not self._closing:
+            self.reconnect_timer.start(RECONNECT_DELAY_MS)
+
+    def _on_message(self, text: str):
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            print(f"[ERROR] Respuesta inválida en el canal de consultas: {text}")
+            return
+        with self._lock:
+            future = self._pending.get(message.get('id'))
+        if future is not None and not future.done():
+            future.set_result(message)
@@ -1,11 +1,13 @@
 import sys
-from PyQt6.QtWidgets import QApplication
+from PyQt6.QtWidgets import QApplication, QMessageBox
 
 from ui import RFIDInterface
 from ui.user_interface import UserInterface
 from ui.components import AuthDialog
 from ui.styles import DARK_THEME
 from core.api_client import api_client
+from core.event_stream import EventStreamWorker
+from core.lookup_channel import LookupChannel
 
 
 def main():
@@ -21,6 +23,24 @@ def main():
         # Configurar token
         if hasattr(user_data, 'token') and user_data.token:
             api_client.set_auth_token(user_data.token)
+
+        # Renovar el token antes de que expire, sin volver a iniciar sesión
+        auth_service = auth_dialog.auth_service
+        auth_service.token_refreshed.connect(api_client.set_auth_token)
+        auth_service.start_auto_refresh(user_data)
+        api_client.token_refresher = auth_service.refresh_now
+
+        # Eventos en vivo: tarjetas registradas en otros equipos, accesos, invalidaciones
+        event_worker = EventStreamWorker(api_client)
+        event_worker.start()
+        app.aboutToQuit.connect(event_worker.stop)
+
+        # Consultas de tarjetas por un WebSocket que queda abierto
+        lookup_channel = LookupChannel(api_client)
+        api_client.lookup_channel = lookup_channel
+        auth_service.token_refreshed.connect(lookup_channel.reconnect)
+        lookup_channel.open()
+        app.aboutToQuit.connect(lookup_channel.close)
         
         # Crear interfaz según tipo de usuario
         if user_data.is_admin:
@@ -30,6 +50,32 @@ def main():
         else:
             window = UserInterface(user_data)
         
+        # Mostrar en la ventana los eventos en vivo (tarjetas registradas, accesos)
+        event_worker.event_received.connect(window.on_server_event)
+        
+        def on_session_expired(message: str):
+            """El token de renovación fue revocado o reutilizado: pedir login de nuevo"""
+            print(f"[DEBUG] ⚠️ Sesión expirada: {message}")
+            api_client.set_auth_token(None)
+            lookup_channel.close()
+            QMessageBox.warning(window, "Sesión expirada",
+                                f"Tu sesión ha expirado ({message}).\nInicia sesión de nuevo para continuar.")
+
+            relogin = AuthDialog(parent=window)
+            new_user = relogin.get_authenticated_user() if relogin.exec() == AuthDialog.DialogCode.Accepted else None
+            if not new_user or new_user.username != user_data.username:
+                # La ventana se creó para este usuario y su rol; sin él no hay sesión que continuar
+                print(f"[DEBUG] ❌ Sin nueva sesión para {user_data.username}, cerrando")
+                app.quit()
+                return
+
+            auth_service.start_auto_refresh(new_user)
+            # Actualiza el token del cliente y reabre el canal de consultas
+            auth_service.token_refreshed.emit(new_user.token)
+            print(f"[DEBUG] ✅ Sesión renovada para {new_user.username}")
+
+        auth_service.session_expired.connect(on_session_expired)
+
         window.show()
         sys.exit(app.exec())
     else:
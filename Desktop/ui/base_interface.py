@@ -174,6 +174,26 @@ class BaseInterface(QMainWindow):
         else:
             print(f"[DEBUG] Evento de conexión: {event}")
     
+    def on_server_event(self, event_type: str, data: dict):
+        """Evento en vivo del servidor (/events); el worker ya invalidó la caché"""
+        current_time = datetime.now().strftime("%H:%M:%S")
+        if event_type == 'identifier':
+            identifier = data.get('identifier', {})
+            action = "REGISTRADA" if data.get('action') == 'created' else "ACTUALIZADA"
+            self._add_connection_event(
+                f"[{current_time}] 🌐 🏷️ TARJETA {action}: {identifier.get('name', 'Desconocido')}"
+            )
+        elif event_type == 'pass':
+            self._on_pass_event(data)
+        elif event_type == 'lagged':
+            # Se perdieron eventos: los contadores pueden estar desfasados
+            self._add_connection_event(f"[{current_time}] 🌐 ⚠️ EVENTOS PERDIDOS, RECARGANDO DATOS")
+            self._on_pass_event(data)
+    
+    def _on_pass_event(self, data: dict):
+        """Acceso registrado por cualquier lector - implementar en clases hijas"""
+        pass
+    
     def _handle_rfid_data(self, data):
         """Maneja datos RFID procesados"""
         print(f"[DEBUG] Datos RFID: {data}")
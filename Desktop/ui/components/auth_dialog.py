@@ -63,7 +63,9 @@ class LoginWorker(QThread):
                     is_admin=user_data_dict.get('is_admin', False),
                     user_id=user_data_dict.get('id'),
                     email=user_data_dict.get('email'),
-                    token=access_token  # 🔥 TOKEN REAL DEL BACKEND
+                    token=access_token,  # 🔥 TOKEN REAL DEL BACKEND
+                    refresh_token=response_data.get('refresh_token'),
+                    expires_in=response_data.get('expires_in')
                 )
                 
                 print(f"[DEBUG] ✅ UserData creado:")
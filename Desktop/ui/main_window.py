@@ -27,24 +27,20 @@ class ImageLoaderWorker(QThread):
         try:
             print(f"[DEBUG] Descargando imagen: {self.image_url}")
             
-            # 🔥 OBTENER TOKEN DE AUTENTICACIÓN
+            # 🔥 LA SESIÓN DEL CLIENTE YA LLEVA EL TOKEN DE AUTENTICACIÓN
             from core.api_client import api_client
-            headers = {}
-            if hasattr(api_client, 'token') and api_client.token:
-                headers['Authorization'] = f'Bearer {api_client.token}'
             
-            # 🔥 DESCARGAR IMAGEN
-            response = requests.get(
+            # 🔥 DESCARGAR IMAGEN (revalidando con ETag si ya se descargó antes)
+            status_code, content, response = api_client.get_with_etag(
                 self.image_url,
-                headers=headers,
-                timeout=10,  # Timeout de 10 segundos
-                stream=True
+                lambda r: r.content,
+                timeout=10  # Timeout de 10 segundos
             )
             
-            if response.status_code == 200:
+            if status_code == 200:
                 # 🔥 CREAR PIXMAP DESDE LOS DATOS
                 pixmap = QPixmap()
-                if pixmap.loadFromData(response.content):
+                if pixmap.loadFromData(content):
                     print(f"[DEBUG] ✅ Imagen descargada exitosamente")
                     self.image_loaded.emit(pixmap, self.name)
                 else:
@@ -63,6 +59,24 @@ class ImageLoaderWorker(QThread):
             self.image_failed.emit(f"Error inesperado: {str(e)}", self.name)
 
 
+# El servidor guarda los accesos en lotes (~1s); esperar un poco antes de pedir los contadores
+STATS_REFRESH_DELAY_MS = 2000
+
+
+class StatsWorker(QThread):
+    """Worker para obtener los contadores de accesos del servidor"""
+
+    stats_loaded = pyqtSignal(dict)
+    stats_failed = pyqtSignal(str)
+
+    def run(self):
+        try:
+            from core.api_client import api_client
+            self.stats_loaded.emit(api_client.get_stats())
+        except Exception as e:
+            self.stats_failed.emit(str(e))
+
+
 class RFIDInterface(BaseInterface):
     """Interfaz RFID completa para administradores"""
     
@@ -74,9 +88,16 @@ class RFIDInterface(BaseInterface):
         # Lista para almacenar eventos
         self.events_log = []
         self.access_history = []
+        self.stats_worker = None
+        
+        # Agrupa varias lecturas seguidas en una sola consulta de contadores
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setSingleShot(True)
+        self.stats_timer.timeout.connect(self._load_counters)
         
         self._init_ui()
         self._start_time_update()
+        self._load_counters()
         
         # 🔥 AGREGAR EVENTO INICIAL
         current_time = datetime.now().strftime("%H:%M:%S")
@@ -361,12 +382,8 @@ class RFIDInterface(BaseInterface):
         """Carga imagen desde el backend"""
         try:
             # 🔥 CONSTRUIR URL COMPLETA
-            # Si image_path es algo como "/static/images/filename.jpg"
-            base_url = api_client.base_url.rstrip('/')  # Remover / final si existe
-            if image_path.startswith('/'):
-                image_url = f"{base_url}{image_path}"
-            else:
-                image_url = f"{base_url}/{image_path}"
+            # Pedir la variante de 128px: se muestra en un círculo de 120px
+            image_url = api_client.image_url(image_path, size=128)
             
             print(f"[DEBUG] Cargando imagen desde: {image_url}")
             
@@ -571,17 +588,44 @@ class RFIDInterface(BaseInterface):
         scrollbar.setValue(scrollbar.maximum())
     
     def _update_counters(self):
-        """Actualiza los contadores del sistema"""
-        total_events = len(self.events_log)
-        today_accesses = len([h for h in self.access_history if datetime.now().strftime("%Y-%m-%d") in h])
+        """Actualiza los contadores del sistema (precalculados por el servidor)"""
+        self.stats_timer.start(STATS_REFRESH_DELAY_MS)
+    
+    def _on_pass_event(self, data: dict):
+        """Acceso registrado en el servidor, también desde otros equipos"""
+        self._update_counters()
+    
+    def _load_counters(self):
+        """Pide los contadores al servidor en segundo plano"""
+        if self.stats_worker and self.stats_worker.isRunning():
+            # Ya hay una consulta en curso; repetir cuando termine
+            self.stats_timer.start(STATS_REFRESH_DELAY_MS)
+            return
+        
+        self.stats_worker = StatsWorker()
+        self.stats_worker.stats_loaded.connect(self._on_stats_loaded)
+        self.stats_worker.stats_failed.connect(
+            lambda error: print(f"[ERROR] No se pudieron obtener los contadores: {error}")
+        )
+        self.stats_worker.start()
+    
+    def _on_stats_loaded(self, stats: dict):
+        """Muestra los contadores recibidos del servidor"""
+        total = stats.get('total', {})
+        today = stats.get('today', {})
         
-        self.events_count_label.setText(str(total_events))
-        self.access_count_label.setText(str(today_accesses))
+        self.events_count_label.setText(str(total.get('granted', 0) + total.get('denied', 0)))
+        self.access_count_label.setText(str(today.get('granted', 0) + today.get('denied', 0)))
     
     def closeEvent(self, event):
         """Limpia recursos al cerrar"""
         if hasattr(self, 'time_timer'):
             self.time_timer.stop()
+        self.stats_timer.stop()
+        
+        # 🔥 ESPERAR AL WORKER DE CONTADORES
+        if self.stats_worker and self.stats_worker.isRunning():
+            self.stats_worker.wait(2000)
         
         # 🔥 LIMPIAR WORKER DE IMAGEN
         if hasattr(self, 'image_worker') and self.image_worker:
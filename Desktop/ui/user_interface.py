@@ -2,7 +2,6 @@ from PyQt6.QtWidgets import (QVBoxLayout, QHBoxLayout, QWidget,
                              QFrame, QLabel, QGroupBox, QMessageBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QFont, QAction, QPixmap, QPainter, QPainterPath, QPen, QBrush, QFont as QGuiFont
-import requests
 
 from core.auth_models import UserData
 from .components import PersonCard
@@ -27,20 +26,15 @@ class ImageLoaderWorker(QThread):
         """Descarga la imagen desde el backend"""
         try:
             from core.api_client import api_client
-            headers = {}
-            if hasattr(api_client, 'token') and api_client.token:
-                headers['Authorization'] = f'Bearer {api_client.token}'
-            
-            response = requests.get(
+            status_code, content, response = api_client.get_with_etag(
                 self.image_url,
-                headers=headers,
-                timeout=10,
-                stream=True
+                lambda r: r.content,
+                timeout=10
             )
             
-            if response.status_code == 200:
+            if status_code == 200:
                 pixmap = QPixmap()
-                if pixmap.loadFromData(response.content):
+                if pixmap.loadFromData(content):
                     self.image_loaded.emit(pixmap, self.name)
                 else:
                     self.image_failed.emit("No se pudo procesar la imagen", self.name)
@@ -480,12 +474,8 @@ class UserInterface(BaseInterface):
         try:
             from core.api_client import api_client
             
-            # Construir URL completa
-            base_url = api_client.base_url.rstrip('/')
-            if image_path.startswith('/'):
-                image_url = f"{base_url}{image_path}"
-            else:
-                image_url = f"{base_url}/{image_path}"
+            # Construir URL completa (variante reducida de 128px)
+            image_url = api_client.image_url(image_path, size=128)
             
             print(f"[DEBUG] Cargando imagen: {image_url}")
             
@@ -0,0 +1,289 @@
+"""Load test for the FastAPI server.
+
+Seeds a separate database (BENCH_DATABASE_PATH, default bench.db), drives the hot
+endpoints at a fixed concurrency and writes throughput and latency
+percentiles as JSON, so two runs can be compared with the `compare` command.
+
+    python -m benchmarks.bench run --cards 1000000 --concurrency 64 --output results/new.json
+    python -m benchmarks.bench compare results/old.json results/new.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Seeding replaces every identifier and pass, so never inherit the server's DATABASE_PATH.
+# Must be set before core.database is imported.
+os.environ["DATABASE_PATH"] = os.getenv("BENCH_DATABASE_PATH", "bench.db")
+
+import httpx
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+SCENARIOS = ("lookup", "login", "create")
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, statuses: dict, errors: int, elapsed: float) -> dict:
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / total * 1000, 3) if total else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if total else 0.0,
+        },
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def drive(make_request, concurrency: int, duration: float, max_requests: int) -> dict:
+    """Runs `concurrency` workers issuing requests until `duration` seconds or `max_requests` pass."""
+    latencies, statuses = [], {}
+    errors = 0
+    issued = 0
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def worker():
+        nonlocal errors, issued
+        while time.perf_counter() < deadline and (not max_requests or issued < max_requests):
+            issued += 1
+            sent = time.perf_counter()
+            try:
+                response = await make_request(issued)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - sent)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code >= 500:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - start)
+
+
+def seed(args):
+    from sqlalchemy import func, select
+
+    from core.database import create_db_and_tables, engine
+    from core.models import Identifier
+    from datagen import generate
+
+    create_db_and_tables()
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(Identifier)).scalar()
+    # Generating millions of rows takes minutes; reuse the database when the scale matches
+    if existing == args.cards and not args.reseed:
+        print(f"Reusing {existing} cards already in {os.environ['DATABASE_PATH']}", file=sys.stderr)
+        return
+    generate(args.cards, args.passes, args.users, rng_seed=args.seed, replace=True,
+             log=lambda message: print(message, file=sys.stderr))
+
+
+async def run_scenarios(client: httpx.AsyncClient, args) -> dict:
+    from datagen import GENERATED_ADMIN, GENERATED_PASSWORD, card_rfid, generated_username
+
+    rng = random.Random(args.seed)
+    run_id = f"{time.time_ns():x}"
+
+    response = await client.post("/login", data={"username": GENERATED_ADMIN, "password": GENERATED_PASSWORD})
+    response.raise_for_status()
+    admin_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def lookup(i):
+        if rng.random() < args.miss_ratio:
+            rfid = hashlib.sha256(f"missing-{run_id}-{i}".encode()).hexdigest().upper()
+        else:
+            rfid = card_rfid(rng.randrange(args.cards))
+        return client.get(f"/identifier/{rfid}")
+
+    def login(i):
+        username = generated_username(rng.randrange(args.users)) if args.users else GENERATED_ADMIN
+        return client.post("/login", data={"username": username, "password": GENERATED_PASSWORD})
+
+    def create(i):
+        rfid = hashlib.sha256(f"new-{run_id}-{i}".encode()).hexdigest().upper()
+        return client.post("/identifier", data={"rfid": rfid, "name": f"New {i}", "access": "true"},
+                           headers=admin_headers)
+
+    requests = {"lookup": lookup, "login": login, "create": create}
+    results = {}
+    for name in args.scenarios:
+        print(f"Running {name} for {args.duration}s at concurrency {args.concurrency}...", file=sys.stderr)
+        results[name] = await drive(requests[name], args.concurrency, args.duration, args.requests)
+    return results
+
+
+async def run_in_process(args) -> dict:
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            return await run_scenarios(client, args)
+
+
+async def run_over_http(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        return await run_scenarios(client, args)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_uvicorn(port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR,
+        env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    if not args.no_seed:
+        seed(args)
+
+    if args.url:
+        target = args.url
+        results = asyncio.run(run_over_http(args.url, args))
+    elif args.target == "uvicorn":
+        port = free_port()
+        target = f"http://127.0.0.1:{port}"
+        process = start_uvicorn(port)
+        try:
+            results = asyncio.run(run_over_http(target, args))
+        finally:
+            process.terminate()
+            process.wait(10)
+    else:
+        target = "in-process"
+        results = asyncio.run(run_in_process(args))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": target,
+            "database": os.environ["DATABASE_PATH"],
+            "cards": args.cards,
+            "users": args.users,
+            "passes": args.passes,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "miss_ratio": args.miss_ratio,
+        },
+        "scenarios": results,
+    }
+
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        print(f"{name:8} {result['throughput_rps']:>10.1f} req/s  p50 {latency['p50']:>8.2f}ms  "
+              f"p95 {latency['p95']:>8.2f}ms  p99 {latency['p99']:>8.2f}ms  errors {result['errors']}")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+def compare(args):
+    old = json.loads(Path(args.old).read_text())["scenarios"]
+    new = json.loads(Path(args.new).read_text())["scenarios"]
+
+    def change(before, after):
+        return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+    print(f"{'scenario':10} {'req/s':>22} {'p50 ms':>22} {'p99 ms':>22}")
+    for name in sorted(set(old) & set(new)):
+        row = [f"{name:10}"]
+        for before, after in (
+            (old[name]["throughput_rps"], new[name]["throughput_rps"]),
+            (old[name]["latency_ms"]["p50"], new[name]["latency_ms"]["p50"]),
+            (old[name]["latency_ms"]["p99"], new[name]["latency_ms"]["p99"]),
+        ):
+            row.append(f"{before:>8.1f} -> {after:>8.1f} {change(before, after):>7}")
+        print(" ".join(row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Seed the bench database and run the load scenarios")
+    run_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run_parser.add_argument("--cards", type=int, default=100000)
+    run_parser.add_argument("--users", type=int, default=100)
+    run_parser.add_argument("--passes", type=int, default=100000)
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    run_parser.add_argument("--requests", type=int, default=0, help="stop a scenario after this many requests")
+    run_parser.add_argument("--miss-ratio", type=float, default=0.1, help="share of lookups for unknown cards")
+    run_parser.add_argument("--target", choices=("inprocess", "uvicorn"), default="inprocess")
+    run_parser.add_argument("--url", help="benchmark an already running server instead")
+    run_parser.add_argument("--timeout", type=float, default=30)
+    run_parser.add_argument("--seed", type=int, default=0, help="random seed for data and request mix")
+    run_parser.add_argument("--reseed", action="store_true", help="rebuild the data even if the scale matches")
+    run_parser.add_argument("--no-seed", action="store_true")
+    run_parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two JSON reports")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Query-plan regression check.
+
+Calls every endpoint in-process against a generated database, records each
+SQL statement it issues and runs EXPLAIN QUERY PLAN on it. Exits with status 1
+when a statement of a hot endpoint needs a full table scan, a temp B-tree sort
+or an automatic index, so a lost or unusable index is caught before deploy.
+
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --cards 100000 --passes 1000000 --output plans.json
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Always a throwaway database: the check regenerates its data. Set before core.database is imported.
+TEMP_DIR = tempfile.mkdtemp(prefix="query-plans-")
+os.environ["DATABASE_PATH"] = os.path.join(TEMP_DIR, "plans.db")
+
+from sqlalchemy import event
+
+PLAN_PROBLEMS = (
+    (re.compile(r"^SCAN \w+( AS \w+)?$"), "full table scan"),
+    (re.compile(r"USE TEMP B-TREE"), "temp b-tree"),
+    (re.compile(r"AUTOMATIC (PARTIAL )?(COVERING )?INDEX"), "automatic index"),
+)
+EXPLAINED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+# Written by the background pass log writer, whichever endpoint happens to be running
+PASS_LOG_STATEMENTS = ("INSERT INTO passregister", "INSERT INTO passstat")
+PASS_LOG_GROUP = "pass log writer"
+
+
+class StatementRecorder:
+    """Collects (statement, parameters) per named group from both engines."""
+
+    def __init__(self):
+        self.groups = {}
+        self.current = None
+
+    def attach(self, engine):
+        event.listen(engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.current is None or not statement.lstrip().upper().startswith(EXPLAINED):
+            return
+        # Batched "insertmanyvalues" statements already come with one flat parameter tuple
+        if executemany and parameters and isinstance(parameters[0], (list, tuple, dict)):
+            parameters = parameters[0]
+        group = PASS_LOG_GROUP if statement.lstrip().startswith(PASS_LOG_STATEMENTS) else self.current
+        self.groups.setdefault(group, (True, {}))[1].setdefault(statement, parameters)
+
+    def group(self, name: str, hot: bool):
+        self.current = name
+        self.groups.setdefault(name, (hot, {}))
+
+
+def explain(connection, statement: str, parameters) -> list:
+    rows = connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[3] for row in rows]
+
+
+def plan_problems(plan: list) -> list:
+    return [f"{reason}: {detail}" for detail in plan for pattern, reason in PLAN_PROBLEMS if pattern.search(detail)]
+
+
+def exercise_endpoints(recorder: StatementRecorder, cards: int):
+    """Calls each endpoint the way the desktop and admin tools do."""
+    from fastapi.testclient import TestClient
+
+    import main
+    from datagen import GENERATED_ADMIN, GENERATED_PASSWORD, card_rfid
+
+    with TestClient(main.app) as client:
+        recorder.group("POST /register", hot=True)
+        client.post("/register", json={"username": "query-plan-check", "email": "query-plan-check@bench.local",
+                                       "password": GENERATED_PASSWORD}).raise_for_status()
+
+        recorder.group("POST /login", hot=True)
+        response = client.post("/login", data={"username": GENERATED_ADMIN, "password": GENERATED_PASSWORD})
+        response.raise_for_status()
+        tokens = response.json()
+        client.headers["Authorization"] = f"Bearer {tokens['access_token']}"
+
+        recorder.group("POST /token/refresh", hot=True)
+        client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]}).raise_for_status()
+        # A retried refresh within the grace window continues the same token family
+        client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]}).raise_for_status()
+
+        # Bearer tokens are cached after the first request; start each group cold
+        def fresh_principal():
+            main.principal_cache.tokens.clear()
+
+        recorder.group("GET /identifier/{rfid_id}", hot=True)
+        fresh_principal()
+        client.get(f"/identifier/{card_rfid(1)}").raise_for_status()
+
+        recorder.group("POST /identifiers/lookup", hot=True)
+        fresh_principal()
+        client.post("/identifiers/lookup", json={"rfids": [card_rfid(i) for i in range(2, 50)]}).raise_for_status()
+
+        recorder.group("POST /identifier", hot=True)
+        client.post("/identifier", data={"rfid": "QUERY-PLAN-CHECK", "name": "Query plan check"}).raise_for_status()
+        client.post("/identifier", data={"rfid": "QUERY-PLAN-CHECK", "name": "Query plan check",
+                                         "replace": "true"}).raise_for_status()
+
+        # Half of the rows already exist and hit the ON CONFLICT path
+        recorder.group("POST /identifiers/import", hot=True)
+        rows = "".join(f"{card_rfid(i)},Imported {i},1\n" for i in range(cards - 10, cards + 10))
+        client.post("/identifiers/import", files={"file": ("cards.csv", "rfid,name,access\n" + rows)}).raise_for_status()
+
+        recorder.group("GET /passes", hot=True)
+        fresh_principal()
+        page = client.get("/passes", params={"limit": 20})
+        page.raise_for_status()
+        client.get("/passes", params={"limit": 20, "cursor": page.json()["next_cursor"]}).raise_for_status()
+        client.get("/passes", params={"rfid": card_rfid(0), "limit": 20}).raise_for_status()
+        since = (datetime.now() - timedelta(days=7)).isoformat()
+        client.get("/passes", params={"since": since, "until": datetime.now().isoformat()}).raise_for_status()
+        client.get("/passes", params={"rfid": card_rfid(0), "since": since}).raise_for_status()
+
+        recorder.group("GET /stats", hot=True)
+        fresh_principal()
+        client.get("/stats", params={"rfid": card_rfid(0)}).raise_for_status()
+
+        # Full exports and GC read whole tables by design; their plans are reported, not enforced
+        recorder.group("GET /passes?name=", hot=False)
+        client.get("/passes", params={"name": "García", "limit": 20}).raise_for_status()
+
+        recorder.group("GET /identifiers/export", hot=False)
+        client.get("/identifiers/export").raise_for_status()
+
+        recorder.group("GET /passes/export", hot=False)
+        client.get("/passes/export", params={"since": since}).raise_for_status()
+
+        recorder.group("POST /images/gc", hot=False)
+        client.post("/images/gc").raise_for_status()
+
+        recorder.group(PASS_LOG_GROUP, hot=True)
+    recorder.current = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=5000)
+    parser.add_argument("--passes", type=int, default=50000)
+    parser.add_argument("--output", help="also write every statement and plan as JSON")
+    parser.add_argument("--verbose", action="store_true", help="print plans of passing statements too")
+    args = parser.parse_args()
+
+    from core.database import DATABASE_PATH, async_engine, engine
+    from datagen import generate
+
+    # Plans depend on table statistics, so check them against realistic data
+    generate(args.cards, args.passes, users=1, replace=True, log=lambda message: None)
+
+    recorder = StatementRecorder()
+    recorder.attach(engine)
+    recorder.attach(async_engine.sync_engine)
+    try:
+        exercise_endpoints(recorder, args.cards)
+        failures = check_plans(recorder, DATABASE_PATH, args)
+    finally:
+        engine.dispose()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    print(f"\n{failures} statement(s) with plan regressions" if failures else "\nAll hot statements use indexes")
+    sys.exit(1 if failures else 0)
+
+
+def check_plans(recorder: StatementRecorder, database_path: str, args) -> int:
+    """Explains every recorded statement; returns how many hot ones have a bad plan."""
+    report = []
+    failures = 0
+    with sqlite3.connect(database_path) as connection:
+        for name, (hot, statements) in recorder.groups.items():
+            print(f"{name}{'' if hot else '  (not enforced)'}")
+            for statement, parameters in statements.items():
+                plan = explain(connection, statement, parameters)
+                problems = plan_problems(plan) if hot else []
+                failures += bool(problems)
+                report.append({"group": name, "hot": hot, "statement": statement, "plan": plan, "problems": problems})
+
+                if problems or args.verbose:
+                    print(f"  {'FAIL' if problems else 'ok  '} {' '.join(statement.split())}")
+                    for detail in plan:
+                        print(f"         {detail}")
+                    for problem in problems:
+                        print(f"         -> {problem}")
+            if not args.verbose:
+                print(f"  {len(statements)} statements checked")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    return failures
+
+
+if __name__ == "__main__":
+    main()
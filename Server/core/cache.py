@@ -0,0 +1,209 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IDENTIFIER_CACHE_SIZE = int(os.getenv("IDENTIFIER_CACHE_SIZE", "10000"))
+IDENTIFIER_CACHE_TTL_SECONDS = float(os.getenv("IDENTIFIER_CACHE_TTL_SECONDS", "300"))
+UNKNOWN_RFID_CACHE_SIZE = int(os.getenv("UNKNOWN_RFID_CACHE_SIZE", "10000"))
+UNKNOWN_RFID_CACHE_TTL_SECONDS = float(os.getenv("UNKNOWN_RFID_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+RFID_FILTER_CAPACITY = int(os.getenv("RFID_FILTER_CAPACITY", "100000"))
+RFID_FILTER_ERROR_RATE = float(os.getenv("RFID_FILTER_ERROR_RATE", "0.001"))
+# Other workers, datagen.py and direct SQL bypass this process's invalidation; add their
+# new identifiers to the filter and drop cached ones this often so changes show up (0 = never)
+IDENTIFIER_REFRESH_SECONDS = float(os.getenv("IDENTIFIER_REFRESH_SECONDS", "60"))
+
+
+class LRUCache:
+    """Size-bounded LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class BloomFilter:
+    """Set membership with no false negatives; `key in filter` may be a false positive."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self._lock = threading.Lock()
+        self.error_rate = error_rate
+        self.count = 0
+        # Keys added while a rebuild is loading, replayed into the new bits
+        self._late_keys: Optional[list] = None
+        self._state = self._empty_state(capacity)
+
+    def _empty_state(self, capacity: int) -> tuple:
+        # (capacity, num_bits, num_hashes, bits) swapped as one, so lookups never mix two filters
+        capacity = max(capacity, 1)
+        num_bits = max(8, int(-capacity * math.log(self.error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return capacity, num_bits, num_hashes, bytearray((num_bits + 7) // 8)
+
+    @staticmethod
+    def _positions(key: str, num_bits: int, num_hashes: int):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+    @classmethod
+    def _set(cls, state: tuple, key: str):
+        _, num_bits, num_hashes, bits = state
+        for pos in cls._positions(key, num_bits, num_hashes):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def add(self, key: str):
+        with self._lock:
+            self._set(self._state, key)
+            self.count += 1
+            if self._late_keys is not None:
+                self._late_keys.append(key)
+
+    def rebuild(self, load_keys: Callable[[], Iterable[str]], expected: int = 0):
+        """Loads the keys `load_keys()` returns into fresh bits, sized for twice `expected`, then swaps them in.
+
+        Keys added from before `load_keys` is called are replayed into the new
+        bits, and lookups keep using the old bits until the swap, so a rebuild
+        never produces false negatives.
+        """
+        with self._lock:
+            state = self._empty_state(max(self.capacity, 2 * expected))
+            self._late_keys = []
+        count = 0
+        for key in load_keys():
+            self._set(state, key)
+            count += 1
+        with self._lock:
+            for key in self._late_keys:
+                self._set(state, key)
+            self.count = count + len(self._late_keys)
+            self._late_keys = None
+            self._state = state
+
+    def __contains__(self, key: str) -> bool:
+        _, num_bits, num_hashes, bits = self._state
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key, num_bits, num_hashes))
+
+    @property
+    def capacity(self) -> int:
+        return self._state[0]
+
+    def stats(self) -> dict:
+        capacity, num_bits, num_hashes, _ = self._state
+        return {
+            "count": self.count,
+            "capacity": capacity,
+            "num_bits": num_bits,
+            "num_hashes": num_hashes,
+        }
+
+
+class PrincipalCache:
+    """Validated bearer tokens mapped to their user, until the token's `exp`.
+
+    Each username carries a version; `invalidate_user` bumps it so every
+    token cached for that user is treated as a miss.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.tokens = LRUCache(maxsize, ttl)
+        self._versions: dict = {}
+
+    def get(self, token: str) -> Optional[Any]:
+        entry = self.tokens.get(token)
+        if entry is None:
+            return None
+        username, version, user = entry
+        if self._versions.get(username, 0) != version:
+            self.tokens.invalidate(token)
+            return None
+        return user
+
+    def set(self, token: str, username: str, user: Any, expires_at: float):
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            self.tokens.set(token, (username, self._versions.get(username, 0), user), ttl)
+
+    def invalidate_user(self, username: str):
+        self._versions[username] = self._versions.get(username, 0) + 1
+
+    def stats(self) -> dict:
+        return self.tokens.stats()
+
+
+# Identifier rows keyed by RFID hash, one per server process
+identifier_cache = LRUCache(IDENTIFIER_CACHE_SIZE, IDENTIFIER_CACHE_TTL_SECONDS)
+
+# RFIDs confirmed missing in the DB after passing the filter (false positives)
+unknown_rfid_cache = LRUCache(UNKNOWN_RFID_CACHE_SIZE, UNKNOWN_RFID_CACHE_TTL_SECONDS)
+
+# Every registered Identifier.rfid, rebuilt on startup and extended by the refresh loop
+rfid_filter = BloomFilter(RFID_FILTER_CAPACITY, RFID_FILTER_ERROR_RATE)
+
+# Bearer token -> User, so repeat requests skip JWT verification and the user query
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
@@ -1,8 +1,140 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import event, inspect
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine
 
-sqlite_url = "sqlite:///./database.db"
+from core.rfid import migrate_rfid_storage
+
+load_dotenv()
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "./database.db")
+sqlite_url = f"sqlite:///{DATABASE_PATH}"
+async_sqlite_url = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+
+# PRAGMAs applied to every new connection. "production" lets readers run
+# alongside the writer (WAL) and trades fsync on every commit for one per checkpoint.
+SQLITE_PROFILES = {
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+    },
+    "default": {},
+}
+
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+sqlite_pragmas = dict(SQLITE_PROFILES[DB_PROFILE])
+for pragma in ("journal_mode", "synchronous", "mmap_size", "busy_timeout", "cache_size"):
+    override = os.getenv(f"SQLITE_{pragma.upper()}")
+    if override:
+        sqlite_pragmas[pragma] = override
+
+engine_options = {
+    "echo": DB_ECHO,
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "connect_args": {
+        "check_same_thread": False,
+        # sqlite3 keeps this many prepared statements per connection
+        "cached_statements": DB_STATEMENT_CACHE_SIZE,
+        "timeout": int(sqlite_pragmas.get("busy_timeout", 5000)) / 1000,
+    },
+}
+
+# Sync engine for table creation and startup jobs, async engine for request handlers
+engine = create_engine(sqlite_url, **engine_options)
+async_engine = create_async_engine(async_sqlite_url, **engine_options)
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in sqlite_pragmas.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+event.listen(engine, "connect", apply_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+def add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+# Unique indexes whose duplicate rows may be deleted automatically: (table, columns).
+# Lookups by RFID always returned the oldest identifier, so the others were unreachable.
+DEDUPLICATE_ON_UNIQUE = {("identifier", ("rfid",))}
+
+def sync_index_uniqueness():
+    """Rebuilds indexes whose unique flag changed in the models.
+
+    Before an index becomes unique, duplicate rows are deleted (keeping the
+    oldest, lowest rowid) only for the columns in DEDUPLICATE_ON_UNIQUE; any
+    other table with duplicates stops the migration instead.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"]: bool(index["unique"]) for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing or existing[index.name] == bool(index.unique):
+                    continue
+                count = 0
+                if index.unique:
+                    key = tuple(column.name for column in index.columns)
+                    columns = ", ".join(f'"{name}"' for name in key)
+                    duplicates = (
+                        f'FROM "{table.name}" WHERE rowid NOT IN '
+                        f'(SELECT MIN(rowid) FROM "{table.name}" GROUP BY {columns})'
+                    )
+                    # Checked before touching anything: pysqlite runs DDL outside the transaction
+                    count = conn.exec_driver_sql(f"SELECT count(*) {duplicates}").scalar()
+                    if count and (table.name, key) not in DEDUPLICATE_ON_UNIQUE:
+                        raise RuntimeError(
+                            f"{table.name} has {count} rows duplicating {', '.join(key)}; "
+                            f"remove them before {index.name} can become unique"
+                        )
+
+                conn.exec_driver_sql(f'DROP INDEX "{index.name}"')
+                if count:
+                    conn.exec_driver_sql(f"DELETE {duplicates}")
+                    print(f"Deleted {count} duplicate {table.name} rows (same {', '.join(key)}, kept the oldest)")
+                index.create(conn)
+
+# Indexes no longer in the models, dropped from existing databases
+OBSOLETE_INDEXES = ("ix_passregister_rfid",)
 
-engine = create_engine(sqlite_url, echo=True)
+def drop_obsolete_indexes():
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    add_missing_columns()
+    sync_index_uniqueness()
+    drop_obsolete_indexes()
+    SQLModel.metadata.create_all(engine)
+    # create_all skips existing tables, so add indexes introduced since they were created
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    return migrate_rfid_storage(engine, SQLModel.metadata)
@@ -0,0 +1,139 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EVENT_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE_SIZE", "1000"))
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+EVENT_MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "100"))
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """One client's pending events; when full, the oldest event is dropped."""
+
+    def __init__(self, maxsize: int):
+        self.dropped = 0
+        self._events = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self._lagged = 0
+
+    def put(self, event: dict) -> bool:
+        """Queues `event`; True if an older event had to be dropped for it."""
+        full = len(self._events) == self._events.maxlen
+        if full:
+            self.dropped += 1
+            self._lagged += 1
+        self._events.append(event)
+        self._ready.set()
+        return full
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        if not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        # Tell the client it missed events so it can resync instead of trusting its state
+        if self._lagged:
+            lagged, self._lagged = self._lagged, 0
+            return {"id": None, "type": "lagged", "data": {"dropped": lagged}}
+        return self._events.popleft()
+
+
+class EventBroker:
+    """Fans events out to every subscriber without ever waiting on one.
+
+    `publish()` may be called from the event loop or from threadpool code
+    (imports, startup jobs); off-loop calls are handed to the loop.
+    """
+
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.dropped = 0
+        self._ids = itertools.count(1)
+        self._subscribers: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self):
+        self._loop = None
+        self._subscribers.clear()
+
+    def subscribe(self) -> Subscription:
+        if len(self._subscribers) >= self.max_subscribers:
+            raise TooManySubscribers(f"Event stream limit of {self.max_subscribers} subscribers reached")
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, data: dict):
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        event = {"id": next(self._ids), "type": event_type, "data": data, "time": time.time()}
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._broadcast(event)
+        else:
+            loop.call_soon_threadsafe(self._broadcast, event)
+
+    def _broadcast(self, event: dict):
+        self.published += 1
+        for subscription in list(self._subscribers):
+            if subscription.put(event):
+                self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+def format_sse(event: dict) -> str:
+    lines = []
+    if event["id"] is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(broker: EventBroker, subscription: Subscription):
+    try:
+        # Starts the stream right away so clients and proxies see the connection is live
+        yield ": connected\n\n"
+        while True:
+            event = await subscription.get(EVENT_KEEPALIVE_SECONDS)
+            yield format_sse(event) if event else ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# Pass events, identifier changes and cache invalidations for connected desktops
+event_broker = EventBroker(EVENT_SUBSCRIBER_QUEUE_SIZE, EVENT_MAX_SUBSCRIBERS)
@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Iterator, List
+
+from dotenv import load_dotenv
+from sqlmodel import Session
+
+from core.database import engine
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def to_json_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_rows(statement, columns: List[str], fmt: str) -> Iterator[str]:
+    """Streams `statement` as CSV or NDJSON, `EXPORT_BATCH_SIZE` rows per chunk.
+
+    yield_per keeps a single cursor open and fetches rows in batches, so the
+    table is never loaded into memory at once.
+    """
+    with Session(engine) as db:
+        result = db.exec(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            # Header only, when the query returned no rows
+            if buffer.getvalue():
+                yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield "".join(
+                    json.dumps({column: to_json_value(value) for column, value in zip(columns, row)}) + "\n"
+                    for row in rows
+                )
@@ -0,0 +1,37 @@
+import hashlib
+import json
+import os
+from email.utils import parsedate
+
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+
+load_dotenv()
+
+# Access can be revoked at any time, so identifier JSON may be stored but must be revalidated
+IDENTIFIER_CACHE_CONTROL = os.getenv("IDENTIFIER_CACHE_CONTROL", "private, no-cache")
+# Legacy, non content-addressed uploads
+IMAGE_CACHE_CONTROL = os.getenv("IMAGE_CACHE_CONTROL", "public, max-age=86400")
+
+
+def record_etag(data) -> str:
+    body = json.dumps(jsonable_encoder(data), sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+
+def is_not_modified(request_headers: Headers, response_headers) -> bool:
+    """Same rules as StaticFiles: If-None-Match wins, If-Modified-Since is the fallback."""
+    if_none_match = request_headers.get("if-none-match")
+    etag = response_headers.get("etag")
+    if if_none_match and etag:
+        return if_none_match.strip() == "*" or etag in [tag.strip(" W/") for tag in if_none_match.split(",")]
+
+    if_modified_since = parsedate(request_headers.get("if-modified-since") or "")
+    last_modified = parsedate(response_headers.get("last-modified") or "")
+    return bool(if_modified_since and last_modified and if_modified_since >= last_modified)
+
+
+def not_modified(response_headers) -> NotModifiedResponse:
+    return NotModifiedResponse(Headers(response_headers))
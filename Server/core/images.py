@@ -0,0 +1,267 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+load_dotenv()
+
+IMAGES_DIR = Path("static/images")
+VARIANTS_DIR = IMAGES_DIR / "variants"
+UPLOAD_TMP_DIR = IMAGES_DIR / "tmp"
+
+IMAGE_VARIANT_SIZES = tuple(int(size) for size in os.getenv("IMAGE_VARIANT_SIZES", "64,128,256").split(","))
+IMAGE_VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "webp").lower()
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+IMAGE_GC_INTERVAL_SECONDS = float(os.getenv("IMAGE_GC_INTERVAL_SECONDS", "3600"))
+# Unreferenced files younger than this are kept: their identifier may not be committed yet
+IMAGE_GC_GRACE_SECONDS = float(os.getenv("IMAGE_GC_GRACE_SECONDS", "3600"))
+
+# Content-addressed names never change meaning, so clients may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+# Room for the other form fields and the multipart boundaries around the photo
+UPLOAD_FORM_OVERHEAD_BYTES = int(os.getenv("UPLOAD_FORM_OVERHEAD_BYTES", "65536"))
+IMAGE_MAGIC_BYTES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+)
+CONTENT_NAME = re.compile(r"([0-9a-f]{64})(?:_\d+)?")
+
+VARIANT_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+VARIANT_MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+
+def content_hash(filename: str) -> Optional[str]:
+    """SHA-256 a stored image or variant is named after; None for legacy uploads."""
+    match = CONTENT_NAME.fullmatch(Path(filename).stem)
+    return match.group(1) if match else None
+
+
+def shard_dir(base: Path, filename: str) -> Path:
+    # Two levels of 256 directories keep any one directory small
+    digest = content_hash(filename)
+    return base / digest[:2] / digest[2:4] if digest else base
+
+
+def image_file(filename: str) -> Path:
+    return shard_dir(IMAGES_DIR, filename) / filename
+
+
+def image_url_path(filename: str) -> str:
+    return "/" + image_file(filename).as_posix()
+
+
+def variant_path(filename: str, size: int) -> Path:
+    name = f"{Path(filename).stem}_{size}{VARIANT_EXTENSIONS[IMAGE_VARIANT_FORMAT]}"
+    return shard_dir(VARIANTS_DIR, name) / name
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+def sniff_image_extension(head: bytes) -> Optional[str]:
+    """File extension for the image format `head` starts with, judged by magic bytes."""
+    for magic, extension in IMAGE_MAGIC_BYTES:
+        if head.startswith(magic):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+class PendingImage:
+    """An upload fully written to a temp file, not yet visible under its final name."""
+
+    def __init__(self, temp_path: Path, filename: str, size: int):
+        self.temp_path = temp_path
+        self.filename = filename
+        self.size = size
+
+    def publish(self):
+        """Atomically moves the temp file into content-addressed storage."""
+        target = image_file(self.filename)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            self.temp_path.unlink(missing_ok=True)
+            # Restart the GC grace period in case the existing copy was an orphan
+            os.utime(target)
+        else:
+            self.temp_path.replace(target)
+        return target
+
+    def discard(self):
+        self.temp_path.unlink(missing_ok=True)
+
+
+class UploadLimitMiddleware:
+    """Caps request bodies on upload routes while they arrive.
+
+    Starlette spools the whole multipart form before the handler runs, so the
+    checks in `receive_image` alone would only fire after a full upload. This
+    answers 413 on a too large Content-Length, or stops reading a chunked body
+    as soon as it passes the cap.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int, on_reject=lambda: None):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+        self.on_reject = on_reject
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body larger than {self.max_bytes} bytes"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            self.on_reject()
+            await JSONResponse({"detail": detail}, status_code=413, headers={"connection": "close"})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    self.on_reject()
+                    # Raised inside form parsing, answered as 413 by the exception middleware
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def receive_image(upload) -> PendingImage:
+    """Streams an UploadFile to a temp file in chunks, hashing it on the way.
+
+    Rejects non-image content types and anything whose first bytes are not a
+    known image format before writing, and stops as soon as the size limit
+    is passed.
+    """
+    content_type = (upload.content_type or "").lower()
+    if content_type and not content_type.startswith("image/") and content_type != "application/octet-stream":
+        raise UnsupportedImage(f"Unsupported content type {content_type}")
+    if upload.size is not None and upload.size > MAX_IMAGE_UPLOAD_BYTES:
+        raise UploadTooLarge(f"Image larger than {MAX_IMAGE_UPLOAD_BYTES} bytes")
+
+    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+    extension = sniff_image_extension(chunk)
+    if extension is None:
+        raise UnsupportedImage("File is not a supported image")
+
+    await run_in_threadpool(UPLOAD_TMP_DIR.mkdir, parents=True, exist_ok=True)
+    temp_path = UPLOAD_TMP_DIR / uuid.uuid4().hex
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(temp_path.open, "wb")
+    try:
+        while chunk:
+            size += len(chunk)
+            if size > MAX_IMAGE_UPLOAD_BYTES:
+                raise UploadTooLarge(f"Image larger than {MAX_IMAGE_UPLOAD_BYTES} bytes")
+            digest.update(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        temp_path.unlink(missing_ok=True)
+        raise
+    await run_in_threadpool(buffer.close)
+
+    return PendingImage(temp_path, digest.hexdigest() + extension, size)
+
+
+def collect_garbage(referenced: Iterable[str]) -> dict:
+    """Mark-and-sweep: deletes stored images, variants and temp files no identifier references."""
+    referenced_stems = {Path(filename).stem for filename in referenced}
+    cutoff = time.time() - IMAGE_GC_GRACE_SECONDS
+    removed = 0
+    freed = 0
+
+    for path in list(IMAGES_DIR.rglob("*")):
+        if not path.is_file():
+            continue
+        if UPLOAD_TMP_DIR in path.parents:
+            live = False
+        elif VARIANTS_DIR in path.parents:
+            live = path.stem.rsplit("_", 1)[0] in referenced_stems
+        else:
+            live = path.stem in referenced_stems
+
+        try:
+            stat = path.stat()
+            if live or stat.st_mtime > cutoff:
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += stat.st_size
+
+    return {"removed": removed, "freed_bytes": freed}
+
+
+def find_variant(filename: str, size: int) -> Optional[Path]:
+    """Smallest generated variant at least `size` px wide, if there is one."""
+    for variant_size in sorted(IMAGE_VARIANT_SIZES):
+        if variant_size >= size:
+            path = variant_path(filename, variant_size)
+            return path if path.exists() else None
+    return None
+
+
+def generate_variants(source: Path):
+    """Writes square, recompressed copies of `source` for every IMAGE_VARIANT_SIZES entry.
+
+    Runs as a background task; concurrent calls for the same file are skipped.
+    """
+    with _in_progress_lock:
+        if source.name in _in_progress:
+            return
+        _in_progress.add(source.name)
+
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            for size in IMAGE_VARIANT_SIZES:
+                target = variant_path(source.name, size)
+                if target.exists():
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+                # Write under a temp name so readers never see a half-written file
+                partial = target.with_name(target.name + ".part")
+                variant.save(partial, format=IMAGE_VARIANT_FORMAT.upper(), quality=IMAGE_VARIANT_QUALITY)
+                partial.replace(target)
+    except (OSError, ValueError) as e:
+        print(f"Could not generate variants for {source}: {e}")
+    finally:
+        with _in_progress_lock:
+            _in_progress.discard(source.name)
@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+from typing import BinaryIO, Callable, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+
+from core.database import engine
+from core.models import Identifier
+
+load_dotenv()
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+
+IMPORT_FORMATS = ("csv", "jsonl")
+TRUE_VALUES = {"1", "true", "yes", "y", "si", "sí"}
+FALSE_VALUES = {"", "0", "false", "no", "n"}
+
+
+def detect_format(filename: str) -> str:
+    suffix = os.path.splitext(filename or "")[1].lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Cannot detect import format from filename {filename!r}, use one of {IMPORT_FORMATS}")
+
+
+def parse_access(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else "").strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid access value {value!r}")
+
+
+def normalize_row(row: dict) -> dict:
+    rfid = str(row.get("rfid") or "").strip()
+    name = str(row.get("name") or "").strip()
+    if not rfid:
+        raise ValueError("Missing rfid")
+    if not name:
+        raise ValueError("Missing name")
+    return Identifier(rfid=rfid, name=name, access=parse_access(row.get("access"))).model_dump()
+
+
+def read_rows(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """Yields (line number, raw row) one line at a time; never holds the whole file."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if line.strip():
+                yield line_number, line
+
+
+def parse_row(fmt: str, raw) -> dict:
+    if fmt == "jsonl":
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e.msg}")
+        if not isinstance(raw, dict):
+            raise ValueError("Expected a JSON object")
+    return normalize_row(raw)
+
+
+def import_identifiers(stream: BinaryIO, fmt: str,
+                       on_inserted: Callable[[List[str]], None] = lambda rfids: None) -> dict:
+    """Bulk-inserts identifiers from a CSV or JSONL stream, `IMPORT_CHUNK_SIZE` rows per transaction.
+
+    Each chunk is a single INSERT ... ON CONFLICT DO NOTHING against the
+    unique rfid index; rows it skipped are reported as already existing,
+    including RFIDs repeated from an earlier chunk. Bad rows are skipped and
+    reported.
+    """
+    report = {"inserted": 0, "rejected": 0, "errors": []}
+
+    def reject(line_number: int, rfid, error: str):
+        report["rejected"] += 1
+        if len(report["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "rfid": rfid, "error": error})
+
+    rows = read_rows(stream, fmt)
+    while chunk := list(islice(rows, IMPORT_CHUNK_SIZE)):
+        valid = {}
+        for line_number, raw in chunk:
+            try:
+                row = parse_row(fmt, raw)
+            except ValueError as e:
+                reject(line_number, raw.get("rfid") if isinstance(raw, dict) else None, str(e))
+                continue
+            if row["rfid"] in valid:
+                reject(line_number, row["rfid"], "Duplicate rfid in file")
+                continue
+            valid[row["rfid"]] = (line_number, row)
+
+        if not valid:
+            continue
+
+        with Session(engine) as db:
+            statement = insert(Identifier).on_conflict_do_nothing(index_elements=[Identifier.rfid])
+            new_rows = [row for _, row in valid.values()]
+            inserted = set(db.exec(statement.returning(Identifier.rfid), params=new_rows).scalars())
+            db.commit()
+
+        for rfid in valid.keys() - inserted:
+            reject(valid[rfid][0], rfid, "Identifier already exists")
+        report["inserted"] += len(inserted)
+        on_inserted(list(inserted))
+
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
@@ -0,0 +1,236 @@
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_API_KEY = os.getenv("METRICS_API_KEY", "")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# (family, type, help, sample name, labels, value)
+Sample = Tuple[str, str, str, str, Dict[str, str], float]
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self) -> Iterable[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, self.kind, self.help, self.name, dict(zip(self.labels, label_values)), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    """Fixed buckets; `observe` bumps a single bucket, cumulative counts are built at scrape time."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                # One slot per bucket plus +Inf, then the running sum
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def collect(self) -> Iterable[Sample]:
+        with self._lock:
+            values = [(label_values, list(entry)) for label_values, entry in self._values.items()]
+        family = self.name, "histogram", self.help
+        for label_values, entry in values:
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield (*family, f"{self.name}_bucket", {**labels, "le": le}, cumulative)
+            yield (*family, f"{self.name}_sum", labels, entry[-1])
+            yield (*family, f"{self.name}_count", labels, cumulative)
+
+
+class StatsCollector:
+    """Exposes a component's `stats()` dict: keys in `counters` as counters, other numbers as gauges."""
+
+    def __init__(self, prefix: str, stats: Callable[[], dict], counters: Iterable[str] = (),
+                 labels: Optional[Dict[str, str]] = None):
+        self.prefix = prefix
+        self.stats = stats
+        self.counters = set(counters)
+        self.labels = labels or {}
+
+    def collect(self) -> Iterable[Sample]:
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in self.counters:
+                name, kind = f"{self.prefix}_{key}_total", "counter"
+            else:
+                name, kind = f"{self.prefix}_{key}", "gauge"
+            yield name, kind, f"{self.prefix} {key.replace('_', ' ')}", name, self.labels, value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.collectors: List = []
+
+    def register(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def stats(self, *args, **kwargs) -> StatsCollector:
+        return self.register(StatsCollector(*args, **kwargs))
+
+    def render(self) -> str:
+        """Prometheus text exposition format, version 0.0.4."""
+        # Collectors sharing a family (e.g. one per cache) are printed under a single header
+        families: Dict[str, list] = {}
+        for collector in self.collectors:
+            for family, kind, help, name, labels, value in collector.collect():
+                families.setdefault(family, [kind, help, []])[2].append((name, labels, value))
+
+        lines = []
+        for family, (kind, help, samples) in families.items():
+            lines.append(f"# HELP {family} {help}")
+            lines.append(f"# TYPE {family} {kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    ("method", "route", "status"),
+)
+http_requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled", ("method",),
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Time spent executing SQL statements", ("engine", "operation"),
+)
+ws_lookup_duration = registry.histogram(
+    "ws_lookup_duration_seconds", "Lookup latency on the WebSocket channel", ("status",),
+)
+image_uploads = registry.counter(
+    "image_uploads_total", "Identifier photo uploads by outcome", ("result",),
+)
+image_upload_bytes = registry.histogram(
+    "image_upload_bytes", "Size of accepted identifier photo uploads", buckets=SIZE_BUCKETS,
+)
+image_upload_duration = registry.histogram(
+    "image_upload_duration_seconds", "Time to receive and hash an identifier photo upload",
+)
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware; labels requests by route template so label cardinality stays bounded."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_progress.dec(method)
+            route = getattr(scope.get("route"), "path", None) or scope.get("root_path") or "unmatched"
+            http_request_duration.observe(elapsed, method, route, str(status_code))
+
+
+def instrument_engine(engine, label: str):
+    """Times every statement run on `engine` and exposes its connection pool."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_duration.observe(time.perf_counter() - context._query_start, label, operation)
+
+    pool = engine.pool
+    registry.stats("db_pool", lambda: {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }, labels={"engine": label})
@@ -1,8 +1,11 @@
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 import uuid
 from typing import Optional
 from datetime import datetime
 
+from core.rfid import RfidType
+
 class Identifier(SQLModel, table=True):
     id: Optional[uuid.UUID] = Field(
         default_factory=uuid.uuid4,
@@ -11,7 +14,9 @@ class Identifier(SQLModel, table=True):
         nullable=False,
     )
     rfid: str = Field(
+        sa_type=RfidType,
         index=True,
+        unique=True,
         nullable=False,
     )
     name: str = Field(
@@ -40,18 +45,53 @@ class User(SQLModel, table=True):
     is_admin: bool = Field(default=False)
 
 class PassRegister(SQLModel, table=True):
+    # id breaks ties between passes sharing a timestamp, so keyset pages stay index-ordered
+    __table_args__ = (
+        Index("ix_passregister_rfid_date", "rfid", "date", "id"),
+        Index("ix_passregister_date", "date", "id"),
+    )
+
     id: Optional[uuid.UUID] = Field(
         default_factory=uuid.uuid4,
         primary_key=True,
         index=True,
         nullable=False,
     )
+    # Lookups by rfid use the leading column of ix_passregister_rfid_date
     rfid: str = Field(
-        index=True,
+        sa_type=RfidType,
         nullable=False,
     )
     date: datetime = Field(
         default_factory=datetime.now,
         nullable=False,
     )
+    granted: bool = Field(
+        default=True,
+        nullable=False,
+        sa_column_kwargs={"server_default": "1"},
+    )
+
+class PassStat(SQLModel, table=True):
+    # Running pass counters, one row per (period, key):
+    # ("total", ""), ("day", "2025-06-10"), ("hour", "2025-06-10T09"), ("card", rfid)
+    period: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    granted: int = Field(default=0, nullable=False)
+    denied: int = Field(default=0, nullable=False)
 
+
+class RefreshToken(SQLModel, table=True):
+    id: Optional[uuid.UUID] = Field(
+        default_factory=uuid.uuid4,
+        primary_key=True,
+        nullable=False,
+    )
+    # SHA-256 of the opaque token; the token itself is never stored
+    token_hash: str = Field(index=True, unique=True)
+    username: str = Field(index=True)
+    # One family per login; rotation passes it on, so a replay revokes only that chain
+    family_id: Optional[uuid.UUID] = Field(default=None, index=True, nullable=True)
+    expires_at: datetime = Field(nullable=False)
+    revoked: bool = Field(default=False, nullable=False)
+    revoked_at: Optional[datetime] = Field(default=None, nullable=True)
@@ -0,0 +1,19 @@
+import base64
+import uuid
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(date: datetime, record_id: uuid.UUID) -> str:
+    raw = f"{date.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Inverse of `encode_cursor`; raises ValueError on a malformed cursor."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        date, record_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(date), uuid.UUID(record_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
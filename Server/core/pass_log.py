@@ -0,0 +1,129 @@
+import asyncio
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from core.database import async_engine
+from core.models import PassRegister
+from core.stats import aggregate_passes, increment_statement
+
+load_dotenv()
+
+PASS_LOG_BATCH_SIZE = int(os.getenv("PASS_LOG_BATCH_SIZE", "500"))
+PASS_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("PASS_LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+PASS_LOG_MAX_QUEUE = int(os.getenv("PASS_LOG_MAX_QUEUE", "100000"))
+# A locked or busy database is retried with doubling delays before a batch counts as failed
+PASS_LOG_WRITE_RETRIES = int(os.getenv("PASS_LOG_WRITE_RETRIES", "5"))
+PASS_LOG_RETRY_DELAY_SECONDS = float(os.getenv("PASS_LOG_RETRY_DELAY_SECONDS", "0.1"))
+
+
+class PassLogWriter:
+    """Write-behind queue for PassRegister rows.
+
+    `record()` never waits on the DB; a background task inserts queued rows
+    in one executemany per batch, whenever `batch_size` rows are waiting or
+    `flush_interval` seconds have passed. PassStat counters are bumped in the
+    same transaction.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.flushes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything still queued and stops the background task."""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._task
+        self._task = None
+
+    def record(self, rfid: str, granted: bool = True):
+        if self._queue is None or self._stopping:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait(PassRegister(rfid=rfid, granted=granted).model_dump())
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._collect()
+            if batch:
+                await self._write(batch)
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            if self._stopping:
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: list):
+        delay = PASS_LOG_RETRY_DELAY_SECONDS
+        for attempt in range(PASS_LOG_WRITE_RETRIES + 1):
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(insert(PassRegister), batch)
+                    await conn.execute(increment_statement(), aggregate_passes(batch))
+            except OperationalError as e:
+                # "database is locked" and friends; the transaction rolled back, so the batch is intact
+                if attempt == PASS_LOG_WRITE_RETRIES:
+                    print(f"Failed to write {len(batch)} pass records after {attempt + 1} attempts: {e}")
+                    self.failed += len(batch)
+                    return
+                self.retries += 1
+                await asyncio.sleep(delay)
+                delay *= 2
+            except Exception as e:
+                print(f"Failed to write {len(batch)} pass records: {e}")
+                self.failed += len(batch)
+                return
+            else:
+                self.written += len(batch)
+                self.flushes += 1
+                return
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "flushes": self.flushes,
+        }
+
+
+pass_log = PassLogWriter(PASS_LOG_BATCH_SIZE, PASS_LOG_FLUSH_INTERVAL_SECONDS, PASS_LOG_MAX_QUEUE)
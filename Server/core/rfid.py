@@ -0,0 +1,115 @@
+import os
+import re
+
+from dotenv import load_dotenv
+from sqlalchemy import String
+from sqlalchemy.types import TypeDecorator
+
+load_dotenv()
+
+# "text" keeps RFIDs as the 64-character hex strings the readers send,
+# "binary" stores SHA-256 RFIDs as 32-byte BLOBs (half the key and index size)
+RFID_STORAGE = os.getenv("RFID_STORAGE", "text")
+if RFID_STORAGE not in ("text", "binary"):
+    raise ValueError(f"RFID_STORAGE must be text or binary, not {RFID_STORAGE}")
+
+# Only the canonical form converts, so every RFID reads back exactly as it was written
+RFID_HASH = re.compile(r"[0-9A-F]{64}")
+RFID_HASH_GLOB = "[0-9A-F]" * 64
+
+
+def rfid_to_blob(rfid):
+    """32 raw bytes for an uppercase hex SHA-256, anything else unchanged."""
+    if isinstance(rfid, str) and RFID_HASH.fullmatch(rfid):
+        return bytes.fromhex(rfid)
+    return rfid
+
+
+def rfid_from_blob(value):
+    if isinstance(value, bytes):
+        return value.hex().upper()
+    return value
+
+
+def store_rfid(rfid):
+    """The value written to an RFID column under the configured storage."""
+    return rfid_to_blob(rfid) if RFID_STORAGE == "binary" else rfid
+
+
+class RfidType(TypeDecorator):
+    """RFID column: hex strings at the API, BLOB keys on disk with RFID_STORAGE=binary.
+
+    SQLite keeps BLOBs as-is even in TEXT columns, so the column is declared
+    the same in both modes and switching needs no table rebuild. RFIDs that
+    are not SHA-256 hashes stay text. Parameters are bound in the configured
+    form only, so rows stored in the other one never match; the server
+    refuses to start until dbcreate.py has converted them.
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return store_rfid(value)
+
+    def process_result_value(self, value, dialect):
+        return rfid_from_blob(value)
+
+
+def rfid_columns(metadata):
+    for table in metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, RfidType):
+                yield table, column
+
+
+def unconverted(name: str) -> str:
+    """WHERE clause for RFIDs not yet in RFID_STORAGE form.
+
+    SQLite sorts every TEXT value before every BLOB, so both are index range
+    scans: BLOBs are >= x'', hex hashes lie between '00..0' and 'FF..F'.
+    """
+    if RFID_STORAGE == "binary":
+        return f"{name} BETWEEN '{'0' * 64}' AND '{'F' * 64}' AND {name} GLOB '{RFID_HASH_GLOB}'"
+    return f"{name} >= x''"
+
+
+def check_rfid_storage(engine, metadata):
+    """Raises RuntimeError if any RFID is stored in the form RFID_STORAGE does not query."""
+    with engine.connect() as conn:
+        for table, column in rfid_columns(metadata):
+            where = unconverted(f'"{column.name}"')
+            if conn.exec_driver_sql(f'SELECT 1 FROM "{table.name}" WHERE {where} LIMIT 1').first():
+                raise RuntimeError(
+                    f"{table.name}.{column.name} has RFIDs not stored as {RFID_STORAGE}; "
+                    f"stop the server and run `RFID_STORAGE={RFID_STORAGE} python dbcreate.py` to convert them"
+                )
+
+
+def migrate_rfid_storage(engine, metadata) -> int:
+    """Converts stored RFIDs to RFID_STORAGE; returns how many rows changed.
+
+    Indexes on a converted column are dropped and rebuilt once, which is much
+    faster than updating them row by row. Run VACUUM afterwards to give the
+    freed pages back to the filesystem.
+    """
+    converted = 0
+    with engine.begin() as conn:
+        # SQLite 3.40 has hex() but no unhex()
+        conn.connection.driver_connection.create_function("rfid_to_blob", 1, rfid_to_blob, deterministic=True)
+        for table, column in rfid_columns(metadata):
+            name = f'"{column.name}"'
+            where = unconverted(name)
+            value = f"rfid_to_blob({name})" if RFID_STORAGE == "binary" else f"hex({name})"
+
+            pending = conn.exec_driver_sql(f'SELECT count(*) FROM "{table.name}" WHERE {where}').scalar()
+            if not pending:
+                continue
+            indexes = [index for index in table.indexes if column.name in index.columns]
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+            conn.exec_driver_sql(f'UPDATE "{table.name}" SET {name} = {value} WHERE {where}')
+            for index in indexes:
+                index.create(conn)
+            converted += pending
+    return converted
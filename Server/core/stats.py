@@ -0,0 +1,74 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert
+
+from core.models import PassStat
+
+
+def stat_keys(rfid: str, date: datetime):
+    yield "total", ""
+    yield "day", date.strftime("%Y-%m-%d")
+    yield "hour", date.strftime("%Y-%m-%dT%H")
+    yield "card", rfid
+
+
+def aggregate_passes(rows: Iterable[dict]) -> list:
+    """Folds PassRegister rows into one PassStat increment per (period, key)."""
+    counters = defaultdict(lambda: [0, 0])
+    for row in rows:
+        outcome = 0 if row["granted"] else 1
+        for period_key in stat_keys(row["rfid"], row["date"]):
+            counters[period_key][outcome] += 1
+
+    return [
+        {"period": period, "key": key, "granted": granted, "denied": denied}
+        for (period, key), (granted, denied) in counters.items()
+    ]
+
+
+def increment_statement():
+    statement = insert(PassStat)
+    return statement.on_conflict_do_update(
+        index_elements=[PassStat.period, PassStat.key],
+        set_={
+            "granted": PassStat.granted + statement.excluded.granted,
+            "denied": PassStat.denied + statement.excluded.denied,
+        },
+    )
+
+
+REBUILD_STATEMENTS = [
+    "DELETE FROM passstat",
+    *(
+        f"""
+        INSERT INTO passstat (period, key, granted, denied)
+        SELECT '{period}', {key}, SUM(granted), SUM(NOT granted)
+        FROM passregister GROUP BY 2
+        """
+        for period, key in (
+            ("total", "''"),
+            ("day", "strftime('%Y-%m-%d', date)"),
+            ("hour", "strftime('%Y-%m-%dT%H', date)"),
+            # Card keys are hex whatever the RFID storage (hex() is uppercase, like the readers)
+            ("card", "CASE typeof(rfid) WHEN 'blob' THEN hex(rfid) ELSE rfid END"),
+        )
+    ),
+]
+
+
+def rebuild_pass_stats(engine):
+    """Recomputes every counter from PassRegister, for databases that predate PassStat."""
+    with engine.begin() as conn:
+        for statement in REBUILD_STATEMENTS:
+            conn.execute(text(statement))
+
+
+def pass_stats_missing(engine) -> bool:
+    """True when PassRegister has rows but PassStat has none, e.g. right after PassStat was added."""
+    with engine.connect() as conn:
+        return bool(conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM passregister) AND NOT EXISTS (SELECT 1 FROM passstat)"
+        )).scalar())
@@ -0,0 +1,222 @@
+"""Synthetic data generator for benchmarks and capacity planning.
+
+Cards get RFIDs hashed the way the reader firmware does it (SHA-256 of the
+uppercase hex UID, sent as uppercase hex). Passes follow workday arrival,
+lunch and departure peaks, quieter weekends, a skewed card popularity and
+repeat taps a few seconds apart.
+
+    python datagen.py --cards 1000000 --passes 10000000 --days 90
+"""
+import argparse
+import bisect
+import hashlib
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from core.database import DATABASE_PATH, create_db_and_tables, engine
+from core.models import Identifier, PassRegister
+from core.rfid import store_rfid
+from core.security import pwd_context
+from core.stats import rebuild_pass_stats
+
+INSERT_CHUNK_SIZE = 100000
+GENERATED_PASSWORD = "bench-password"
+GENERATED_ADMIN = "bench-admin"
+
+FIRST_NAMES = ("Ana", "Carlos", "Lucía", "Mateo", "Sofía", "Diego", "Valentina", "Javier", "Camila", "Andrés",
+               "María", "José", "Laura", "Miguel", "Paula", "Daniel", "Elena", "Pablo", "Isabel", "Tomás")
+LAST_NAMES = ("García", "Rodríguez", "Martínez", "López", "González", "Pérez", "Sánchez", "Ramírez", "Torres",
+              "Flores", "Rivera", "Gómez", "Díaz", "Cruz", "Morales", "Reyes", "Ortiz", "Castro", "Vargas", "Romero")
+
+# (hour of day, standard deviation in hours, share of workday passes); the rest is spread 06:00-22:00
+DAY_PEAKS = ((8.5, 0.6, 0.35), (12.75, 0.75, 0.2), (17.5, 0.8, 0.3))
+WEEKEND_WEIGHT = 0.25
+REPEAT_TAP_PROBABILITY = 0.08
+CARD_POPULARITY_EXPONENT = 0.5
+
+
+def card_uid(index: int) -> str:
+    # Multiplying by an odd constant is a bijection on 32 bits: distinct, random-looking 4-byte UIDs
+    return f"{(index * 2654435761) & 0xFFFFFFFF:08X}"
+
+
+def card_rfid(index: int) -> str:
+    """RFID for generated card `index`, exactly as the reader would send it."""
+    return hashlib.sha256(card_uid(index).encode()).hexdigest().upper()
+
+
+def generated_username(index: int) -> str:
+    return f"bench-user-{index}"
+
+
+def random_id(rng: random.Random) -> str:
+    # Uuid columns are stored as 32 hex characters on SQLite
+    return f"{rng.getrandbits(128):032x}"
+
+
+def identifier_rows(access: bytearray, rng: random.Random):
+    for index, granted in enumerate(access):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        yield random_id(rng), store_rfid(card_rfid(index)), name, granted, None
+
+
+def user_rows(users: int, rng: random.Random):
+    # One bcrypt hash shared by every generated user; hashing per user would dominate the run
+    hashed_password = pwd_context.hash(GENERATED_PASSWORD)
+    for username in (GENERATED_ADMIN, *(generated_username(index) for index in range(users))):
+        yield random_id(rng), username, f"{username}@bench.local", hashed_password, True, username == GENERATED_ADMIN
+
+
+def day_weights(start: datetime, days: int) -> list:
+    return list(itertools.accumulate(
+        WEEKEND_WEIGHT if (start + timedelta(days=day)).weekday() >= 5 else 1.0
+        for day in range(days)
+    ))
+
+
+def time_of_day(rng: random.Random) -> float:
+    """Seconds after midnight for one arrival."""
+    pick = rng.random()
+    for hour, deviation, share in DAY_PEAKS:
+        if pick < share:
+            return min(max(rng.gauss(hour, deviation), 0.0), 23.999) * 3600
+        pick -= share
+    return rng.uniform(6, 22) * 3600
+
+
+def pass_rows(passes: int, cards: int, days: int, unknown_ratio: float, access: bytearray, rng: random.Random):
+    """`passes` PassRegister rows spread over the `days` days before today."""
+    start = datetime.combine(datetime.now().date() - timedelta(days=days), datetime.min.time())
+    cumulative_days = day_weights(start, days)
+    # Zipf-like popularity: a few cards are tapped every day, most only now and then
+    cumulative_cards = list(itertools.accumulate(
+        1 / (rank + 1) ** CARD_POPULARITY_EXPONENT for rank in range(cards)
+    ))
+    base = start.timestamp()
+    produced = 0
+    while produced < passes:
+        day = bisect.bisect_left(cumulative_days, rng.random() * cumulative_days[-1])
+        moment = base + day * 86400 + time_of_day(rng)
+
+        if not cards or rng.random() < unknown_ratio:
+            rfid, granted = hashlib.sha256(f"{rng.getrandbits(32):08X}".encode()).hexdigest().upper(), False
+        else:
+            card = bisect.bisect_left(cumulative_cards, rng.random() * cumulative_cards[-1])
+            rfid, granted = card_rfid(card), bool(access[card])
+
+        # People tap again when the door did not open fast enough
+        taps = 1
+        while rng.random() < REPEAT_TAP_PROBABILITY and taps < 4:
+            taps += 1
+        for _ in range(min(taps, passes - produced)):
+            date = datetime.fromtimestamp(moment).strftime("%Y-%m-%d %H:%M:%S.%f")
+            yield random_id(rng), store_rfid(rfid), date, granted
+            moment += rng.uniform(2, 20)
+            produced += 1
+
+
+def insert_rows(cursor, table: str, columns: tuple, rows) -> int:
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    total = 0
+    while chunk := list(itertools.islice(rows, INSERT_CHUNK_SIZE)):
+        cursor.executemany(statement, chunk)
+        total += len(chunk)
+    return total
+
+
+def generate(cards: int, passes: int, users: int = 10, days: int = 90, access_ratio: float = 0.9,
+             unknown_ratio: float = 0.02, rng_seed: int = 0, replace: bool = False, log=print) -> dict:
+    """Bulk-loads generated identifiers, users and passes in a single transaction.
+
+    Secondary indexes on the identifier and pass tables are dropped first and
+    rebuilt once at the end, which is much faster than maintaining them per row.
+    """
+    create_db_and_tables()
+    with engine.connect() as conn:
+        existing = sum(conn.execute(select(func.count()).select_from(model)).scalar()
+                       for model in (Identifier, PassRegister))
+    if existing and not replace:
+        raise ValueError(f"{DATABASE_PATH} already has identifiers or passes, use --replace to overwrite them")
+
+    rng = random.Random(rng_seed)
+    access = bytearray(rng.random() < access_ratio for _ in range(cards))
+    tables = ("identifier", "passregister")
+    counts = {}
+
+    raw = engine.raw_connection()
+    connection = raw.driver_connection
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None
+    cursor = connection.cursor()
+    synchronous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+    try:
+        # Nothing is durable until COMMIT anyway, so skip the per-page syncs while loading
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("BEGIN")
+        indexes = cursor.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            f"AND tbl_name IN ({', '.join('?' * len(tables))})", tables
+        ).fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+        for table in tables:
+            cursor.execute(f'DELETE FROM "{table}"')
+        # Real accounts are kept; only users from an earlier run are replaced
+        cursor.execute('DELETE FROM "user" WHERE username = ? OR username LIKE ?',
+                       (GENERATED_ADMIN, generated_username(0)[:-1] + "%"))
+
+        started = time.perf_counter()
+        counts["identifiers"] = insert_rows(cursor, "identifier", ("id", "rfid", "name", "access", "image_path"),
+                                            identifier_rows(access, rng))
+        log(f"Inserted {counts['identifiers']} identifiers in {time.perf_counter() - started:.1f}s")
+
+        counts["users"] = insert_rows(cursor, '"user"', ("id", "username", "email", "hashed_password", "is_active", "is_admin"),
+                                      user_rows(users, rng))
+
+        started = time.perf_counter()
+        counts["passes"] = insert_rows(cursor, "passregister", ("id", "rfid", "date", "granted"),
+                                       pass_rows(passes, cards, days, unknown_ratio, access, rng))
+        log(f"Inserted {counts['passes']} passes in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        for _, sql in indexes:
+            cursor.execute(sql)
+        cursor.execute("ANALYZE")
+        log(f"Rebuilt {len(indexes)} indexes in {time.perf_counter() - started:.1f}s")
+        cursor.execute("COMMIT")
+    except BaseException:
+        if connection.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+        connection.isolation_level = isolation_level
+        raw.close()
+
+    started = time.perf_counter()
+    rebuild_pass_stats(engine)
+    log(f"Rebuilt pass counters in {time.perf_counter() - started:.1f}s")
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--passes", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10, help=f"plus {GENERATED_ADMIN}, password {GENERATED_PASSWORD}")
+    parser.add_argument("--days", type=int, default=90, help="spread passes over this many days before today")
+    parser.add_argument("--access-ratio", type=float, default=0.9, help="share of cards with access")
+    parser.add_argument("--unknown-ratio", type=float, default=0.02, help="share of passes by unregistered cards")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replace", action="store_true", help="delete existing identifiers and passes first")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(args.cards, args.passes, args.users, args.days, args.access_ratio, args.unknown_ratio,
+                      args.seed, args.replace)
+    print(f"Generated {counts} into {DATABASE_PATH} in {time.perf_counter() - started:.1f}s")
@@ -1,6 +1,21 @@
-from core.database import create_db_and_tables
+import argparse
+
+from core.database import create_db_and_tables, engine
+from core.rfid import RFID_STORAGE
 from core.models import * # Don't remove, necessary for migrations
+from core.stats import pass_stats_missing, rebuild_pass_stats
 
 if __name__ == '__main__':
-    create_db_and_tables()
+    parser = argparse.ArgumentParser(description="Creates and migrates the database")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="recompute the pass counters from the whole pass history")
+    args = parser.parse_args()
+
+    converted = create_db_and_tables()
+    if converted:
+        print(f"Converted {converted} stored RFIDs to {RFID_STORAGE} storage, run VACUUM to reclaim the space.")
+    # Reads every pass, so only when the counters were just introduced or on request
+    if args.rebuild_stats or pass_stats_missing(engine):
+        rebuild_pass_stats(engine)
+        print("Pass statistics rebuilt from the pass history.")
     print("Database and tables created successfully.")
\ No newline at end of file
@@ -1,27 +1,55 @@
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.security.api_key import APIKeyHeader
-from fastapi import Depends, FastAPI, HTTPException, status, File, UploadFile, Form
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, status, File, UploadFile, Form, Query, Request, Response, WebSocket, WebSocketDisconnect
 from jose import JWTError
-from sqlmodel import Session, select
+from sqlalchemy import delete, event, func, literal_column, or_, tuple_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, PlainTextResponse, StreamingResponse
 from starlette.staticfiles import StaticFiles
-import shutil
+import asyncio
+import hmac
+import json
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from core.database import engine
-from core.models import Identifier, User, PassRegister
+from core.cache import IDENTIFIER_REFRESH_SECONDS, identifier_cache, principal_cache, rfid_filter, unknown_rfid_cache
+from core.database import async_engine, engine
+from core.events import TooManySubscribers, event_broker, event_stream
+from core.exporter import EXPORT_MEDIA_TYPES, export_rows
+from core.http_cache import IDENTIFIER_CACHE_CONTROL, IMAGE_CACHE_CONTROL, is_not_modified, not_modified, record_etag
+from core.images import (
+    IMAGE_GC_INTERVAL_SECONDS, IMAGE_VARIANT_FORMAT, IMAGE_VARIANT_SIZES, IMMUTABLE_CACHE_CONTROL, MAX_IMAGE_UPLOAD_BYTES,
+    UPLOAD_FORM_OVERHEAD_BYTES, VARIANT_MEDIA_TYPES, UnsupportedImage, UploadLimitMiddleware, UploadTooLarge,
+    collect_garbage, content_hash, find_variant, generate_variants, image_file, image_url_path, receive_image,
+)
+from core.importer import IMPORT_FORMATS, detect_format, import_identifiers
+from core.metrics import (
+    METRICS_API_KEY, METRICS_ENABLED, MetricsMiddleware, image_upload_bytes, image_upload_duration,
+    image_uploads, instrument_engine, registry as metrics_registry, ws_lookup_duration,
+)
+from core.models import Identifier, User, PassRegister, PassStat, RefreshToken
+from core.pagination import decode_cursor, encode_cursor
+from core.pass_log import pass_log
+from core.rfid import check_rfid_storage
 from core.security import *
 import uuid
-from pydantic import BaseModel
-from typing import Optional
+from datetime import date, datetime, timedelta
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
+WS_LOOKUP_MAX_IN_FLIGHT = int(os.getenv("WS_LOOKUP_MAX_IN_FLIGHT", "64"))
 
 os.makedirs("static/images", exist_ok=True)
 
-def get_db():
-    with Session(engine) as session:
+async def get_db():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session
 
 class IdentifierCreate(BaseModel):
@@ -30,6 +58,44 @@ class IdentifierCreate(BaseModel):
     access: bool = False
     image_path: Optional[str] = None
 
+class IdentifierLookup(BaseModel):
+    rfids: List[str] = Field(..., max_length=1000)
+
+class IdentifierLookupResult(BaseModel):
+    found: List[Identifier]
+    missing: List[str]
+
+class PassRecord(BaseModel):
+    id: uuid.UUID
+    rfid: str
+    date: datetime
+    name: Optional[str] = None
+
+class PassPage(BaseModel):
+    items: List[PassRecord]
+    next_cursor: Optional[str] = None
+
+class PassCounts(BaseModel):
+    granted: int = 0
+    denied: int = 0
+
+class PassStats(BaseModel):
+    total: PassCounts
+    day: str
+    today: PassCounts
+    hours: dict[str, PassCounts]
+    card: Optional[PassCounts] = None
+
+class ImportRowError(BaseModel):
+    line: int
+    rfid: Optional[str] = None
+    error: str
+
+class ImportReport(BaseModel):
+    inserted: int
+    rejected: int
+    errors: List[ImportRowError]
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 class UserData(BaseModel):
@@ -40,6 +106,11 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user_data: UserData
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
 
 class UserCreate(BaseModel):
     username: str
@@ -47,8 +118,13 @@ class UserCreate(BaseModel):
     password: str
 
 api_key_header = APIKeyHeader(name="X-API-Key")
+metrics_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -63,13 +139,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         print(e)
         raise credentials_exception
 
-    statement = select(User).where(User.username == username)
-    user = db.exec(statement).first()
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        statement = select(User).where(User.username == username)
+        user = (await db.exec(statement)).first()
     if user is None:
         raise credentials_exception
 
+    principal_cache.set(token, username, user, payload["exp"])
     return user
 
+@event.listens_for(User, "after_update")
+def invalidate_user_principals(mapper, connection, target):
+    # Admin/active flag changes must not be served from cached tokens
+    principal_cache.invalidate_user(target.username)
+
 async def get_admin_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(
@@ -79,36 +162,237 @@ async def get_admin_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 
-# APP
-app = FastAPI()
+IDENTIFIER_ROWID = literal_column("identifier.rowid")
+
+# Newest identifier row loaded into rfid_filter. Rows after it are the only new keys
+# (replace keeps the rfid) as long as it still exists: SQLite reuses rowids only
+# once the newest row is deleted.
+rfid_filter_loaded = {"rowid": 0, "id": None}
+
+
+def load_rfid_filter():
+    with Session(engine) as db:
+        total = db.exec(select(func.count()).select_from(Identifier)).one()
+        # Read first, so anything inserted during the load is added again by the next refresh
+        newest = db.exec(select(IDENTIFIER_ROWID, Identifier.id).order_by(IDENTIFIER_ROWID.desc()).limit(1)).first()
+        rfid_filter.rebuild(lambda: db.exec(select(Identifier.rfid)), expected=total)
+    rfid_filter_loaded.update(rowid=newest[0] if newest else 0, id=newest[1] if newest else None)
+
+
+def refresh_rfid_filter():
+    """Adds identifiers inserted since the last load; rebuilds only if rowids may be reused or the filter is full."""
+    with Session(engine) as db:
+        loaded = rfid_filter_loaded["rowid"]
+        newest = db.exec(select(Identifier.id).where(IDENTIFIER_ROWID == loaded)).first() if loaded else None
+        if newest != rfid_filter_loaded["id"] or rfid_filter.count > rfid_filter.capacity:
+            return load_rfid_filter()
+        rows = db.exec(
+            select(IDENTIFIER_ROWID, Identifier.id, Identifier.rfid)
+            .where(IDENTIFIER_ROWID > loaded)
+            .order_by(IDENTIFIER_ROWID)
+        ).all()
+    for _, _, rfid in rows:
+        rfid_filter.add(rfid)
+    if rows:
+        rfid_filter_loaded.update(rowid=rows[-1][0], id=rows[-1][1])
+
+
+async def identifier_refresh_loop():
+    """Picks up identifiers changed outside this process: other workers, datagen.py, direct SQL."""
+    while True:
+        await asyncio.sleep(IDENTIFIER_REFRESH_SECONDS)
+        try:
+            await run_in_threadpool(refresh_rfid_filter)
+        except Exception as e:
+            print(f"RFID filter refresh failed: {e}")
+            continue
+        identifier_cache.clear()
+        unknown_rfid_cache.clear()
+
+
+async def issue_tokens(user: User, db: AsyncSession, family_id: Optional[uuid.UUID] = None) -> dict:
+    refresh_token, token_hash, expires_at = create_refresh_token()
+    await db.exec(delete(RefreshToken).where(
+        RefreshToken.username == user.username,
+        RefreshToken.expires_at < datetime.utcnow(),
+    ))
+    db.add(RefreshToken(token_hash=token_hash, username=user.username, family_id=family_id or uuid.uuid4(),
+                        expires_at=expires_at))
+    await db.commit()
+
+    return {
+        "access_token": create_access_token(data={"sub": user.username}),
+        "token_type": "bearer",
+        "user_data": { "name": user.username, "is_admin": user.is_admin },
+        "refresh_token": refresh_token,
+        "expires_in": int(access_token_lifetime().total_seconds()),
+    }
+
+
+async def hash_password_call(call):
+    try:
+        return await call
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password checks in progress, try again",
+            headers={"Retry-After": "1"},
+        )
+
+
+def identifier_not_found(rfid_id: str):
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={"error": f"Identifier with RFID {rfid_id} not found", "rfid": rfid_id}
+    )
+
+
+def record_pass(rfid_id: str, granted: bool):
+    pass_log.record(rfid_id, granted=granted)
+    event_broker.publish("pass", {"rfid": rfid_id, "granted": granted, "date": datetime.now().isoformat()})
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Lookups bind RFIDs in one storage form only; never serve a half-converted database
+    check_rfid_storage(engine, SQLModel.metadata)
+    load_rfid_filter()
+    await pass_log.start()
+    event_broker.start()
+    image_gc = asyncio.create_task(image_gc_loop()) if IMAGE_GC_INTERVAL_SECONDS > 0 else None
+    identifier_refresh = asyncio.create_task(identifier_refresh_loop()) if IDENTIFIER_REFRESH_SECONDS > 0 else None
+    yield
+    if image_gc:
+        image_gc.cancel()
+    if identifier_refresh:
+        identifier_refresh.cancel()
+    event_broker.stop()
+    await pass_log.stop()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+
+
+# APP
+app = FastAPI(lifespan=lifespan)
+
+class ImageStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if content_hash(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+        return response
+
+app.mount("/static", ImageStaticFiles(directory="static"), name="static")
+app.add_middleware(
+    UploadLimitMiddleware,
+    paths=("/identifier",),
+    max_bytes=MAX_IMAGE_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES,
+    on_reject=lambda: image_uploads.inc("too_large"),
+)
+
+# METRICS
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+    for cache_name, cache in (("identifier", identifier_cache), ("unknown_rfid", unknown_rfid_cache),
+                              ("principal", principal_cache)):
+        metrics_registry.stats("cache", cache.stats, counters=("hits", "misses", "evictions"),
+                               labels={"cache": cache_name})
+    metrics_registry.stats("rfid_filter", rfid_filter.stats)
+    metrics_registry.stats("pass_log", pass_log.stats, counters=("written", "dropped", "failed", "retries", "flushes"))
+    metrics_registry.stats("password_hash", password_hasher.stats, counters=("completed", "rejected"))
+    metrics_registry.stats("events", event_broker.stats, counters=("published", "dropped"))
 
 @app.post("/login", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     statement = select(User).where(User.username == form_data.username)
-    user = db.exec(statement).first()
+    user = (await db.exec(statement)).first()
+
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await hash_password_call(
+            password_hasher.verify_and_update(form_data.password, user.hashed_password)
+        )
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer", "user_data": { "name": user.username, "is_admin": user.is_admin }}
+    # BCRYPT_ROUNDS changed since this hash was made
+    if new_hash:
+        user.hashed_password = new_hash
+        db.add(user)
+        await db.commit()
+
+    return await issue_tokens(user, db)
+
+
+@app.post("/token/refresh", response_model=Token)
+async def refresh_access_token(data: TokenRefresh, db: AsyncSession = Depends(get_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_hash = hash_refresh_token(data.refresh_token)
+    now = datetime.utcnow()
+
+    # Rotation: the first request to revoke a refresh token is the only one allowed to use it
+    statement = (
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > now,
+        )
+        .values(revoked=True, revoked_at=now)
+        .returning(RefreshToken.username, RefreshToken.family_id)
+    )
+    rotated = (await db.exec(statement)).first()
+
+    if rotated is None:
+        statement = select(RefreshToken).where(RefreshToken.token_hash == token_hash, RefreshToken.revoked == True)
+        reused = (await db.exec(statement)).first()
+        if reused is None or reused.family_id is None:
+            raise credentials_exception
+
+        grace = timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+        statement = select(RefreshToken.id).where(RefreshToken.family_id == reused.family_id, RefreshToken.revoked == False)
+        chain_alive = (await db.exec(statement)).first() is not None
+        if chain_alive and reused.revoked_at and now - reused.revoked_at <= grace:
+            # A retried request or two threads refreshing at once: continue the same chain
+            rotated = reused.username, reused.family_id
+        else:
+            # A rotated token replayed later means it leaked; revoke that login's chain only
+            await db.exec(update(RefreshToken).where(RefreshToken.family_id == reused.family_id).values(revoked=True))
+            await db.commit()
+            raise credentials_exception
+
+    username, family_id = rotated
+
+    statement = select(User).where(User.username == username)
+    user = (await db.exec(statement)).first()
+    if user is None:
+        raise credentials_exception
+
+    return await issue_tokens(user, db, family_id)
 
 
 @app.post("/register", response_model=User)
-async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     # Check if username exists
     statement = select(User).where(User.username == user_data.username)
-    if db.exec(statement).first():
+    if (await db.exec(statement)).first():
         raise HTTPException(status_code=400, detail="Username already registered")
 
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password_call(password_hasher.hash(user_data.password))
     new_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -116,63 +400,452 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Remove password from response
     return new_user
 
 
-@app.get("/identifier/{rfid_id}")
-async def identifier(rfid_id: str, db: Session = Depends(get_db)):
+def identifier_response(request: Request, response: Response, data: dict):
+    # Repeat lookups of an unchanged card are answered with a bodyless 304
+    headers = {"etag": record_etag(data), "cache-control": IDENTIFIER_CACHE_CONTROL}
+    if is_not_modified(request.headers, headers):
+        return not_modified(headers)
+    response.headers.update(headers)
+    return data
+
+
+async def lookup_identifier(rfid_id: str, db: AsyncSession) -> Optional[dict]:
+    """Identifier data for a scanned card, or None; records the pass either way."""
+    # Unregistered cards are answered without touching the DB
+    if rfid_id not in rfid_filter:
+        record_pass(rfid_id, granted=False)
+        return None
+
+    cached = identifier_cache.get(rfid_id)
+    if cached is not None:
+        record_pass(rfid_id, granted=cached["access"])
+        return cached
+
+    if unknown_rfid_cache.get(rfid_id) is not None:
+        record_pass(rfid_id, granted=False)
+        return None
+
     statement = select(Identifier).where(Identifier.rfid == rfid_id)
-    result = db.exec(statement).first()
+    result = (await db.exec(statement)).first()
 
     if not result:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={"error": f"Identifier with RFID {rfid_id} not found", "rfid": rfid_id}
-        )
+        unknown_rfid_cache.set(rfid_id, True)
+        record_pass(rfid_id, granted=False)
+        return None
 
-    #pass_register = PassRegister(rfid=rfid_id)
-    #db.add(pass_register)
-    #db.commit()
+    data = result.model_dump()
+    record_pass(rfid_id, granted=result.access)
+    identifier_cache.set(rfid_id, data)
+    return data
 
-    return result
+
+@app.get("/identifier/{rfid_id}")
+async def identifier(rfid_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    data = await lookup_identifier(rfid_id, db)
+    if data is None:
+        raise identifier_not_found(rfid_id)
+    return identifier_response(request, response, data)
+
+
+@app.websocket("/ws/lookup")
+async def lookup_channel(websocket: WebSocket):
+    """Long-lived lookups: the client sends {"id", "rfid"} frames and gets
+    {"id", "status", "identifier"} back, possibly out of order."""
+    token = websocket.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    try:
+        await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+    # The connection outlives the token otherwise; the client reconnects with a fresh one
+    expires_at = jwt.get_unverified_claims(token)["exp"]
+    await websocket.accept()
+
+    in_flight = asyncio.Semaphore(WS_LOOKUP_MAX_IN_FLIGHT)
+    send_lock = asyncio.Lock()
+    tasks = set()
+
+    async def reply(message: dict):
+        async with send_lock:
+            await websocket.send_text(json.dumps(message, default=str, separators=(",", ":")))
+
+    async def answer(request_id, rfid_id: str):
+        start = time.perf_counter()
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                data = await lookup_identifier(rfid_id, db)
+            if data is None:
+                message = {"id": request_id, "status": 404}
+            else:
+                message = {"id": request_id, "status": 200, "identifier": data}
+        except Exception as e:
+            print(f"Lookup {request_id} failed: {e}")
+            message = {"id": request_id, "status": 500}
+        try:
+            await reply(message)
+        finally:
+            ws_lookup_duration.observe(time.perf_counter() - start, str(message["status"]))
+            in_flight.release()
+
+    try:
+        while True:
+            text = await websocket.receive_text()
+            if time.time() >= expires_at:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token expired")
+                return
+
+            frame = None
+            try:
+                frame = json.loads(text)
+                request_id, rfid_id = frame["id"], frame["rfid"]
+                if not isinstance(rfid_id, str) or not rfid_id:
+                    raise ValueError
+            except (ValueError, KeyError, TypeError):
+                await reply({"id": frame.get("id") if isinstance(frame, dict) else None,
+                             "status": 400, "detail": "Expected a JSON object with id and rfid"})
+                continue
+
+            # Stop reading frames while too many lookups are pending for this client
+            await in_flight.acquire()
+            task = asyncio.create_task(answer(request_id, rfid_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/identifiers/lookup", response_model=IdentifierLookupResult)
+async def lookup_identifiers(
+        lookup: IdentifierLookup,
+        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db),
+):
+    # Same as /ws/lookup: bulk answers expose names, access and photos, so a token is required
+    requested = list(dict.fromkeys(lookup.rfids))
+    found = []
+    pending = []
+    for rfid_id in requested:
+        if rfid_id not in rfid_filter:
+            continue
+        cached = identifier_cache.get(rfid_id)
+        if cached is not None:
+            found.append(cached)
+        else:
+            pending.append(rfid_id)
+
+    if pending:
+        statement = select(Identifier).where(Identifier.rfid.in_(pending))
+        for result in await db.exec(statement):
+            data = result.model_dump()
+            identifier_cache.set(result.rfid, data)
+            found.append(data)
+
+    found_rfids = {item["rfid"] for item in found}
+    missing = [rfid_id for rfid_id in requested if rfid_id not in found_rfids]
+    return {"found": found, "missing": missing}
 
 
 @app.post("/identifier", response_model=Identifier)
 async def create_identifier(
+        background_tasks: BackgroundTasks,
         rfid: str = Form(...),
         name: str = Form(...),
-        access: bool = Form(False),
+        access: Optional[bool] = Form(None),
         image: UploadFile = File(None),
-        db: Session = Depends(get_db),
+        replace: bool = Form(False),
+        db: AsyncSession = Depends(get_db),
         admin_user: User = Depends(get_admin_user),
 ):
-    statement = select(Identifier).where(Identifier.rfid == rfid)
-    existing = db.exec(statement).first()
+    identifier_data = {"rfid": rfid, "name": name}
+    # New cards default to no access; a replace keeps the stored access unless it is sent
+    if access is not None:
+        identifier_data["access"] = access
+
+    pending_image = None
+    if image and image.filename:
+        start = time.perf_counter()
+        try:
+            pending_image = await receive_image(image)
+        except UploadTooLarge as e:
+            image_uploads.inc("too_large")
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        except UnsupportedImage as e:
+            image_uploads.inc("unsupported")
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+        image_uploads.inc("accepted")
+        image_upload_bytes.observe(pending_image.size)
+        image_upload_duration.observe(time.perf_counter() - start)
+        # Content-addressed: the same photo uploaded twice is stored once
+        identifier_data["image_path"] = image_url_path(pending_image.filename)
+
+    new_identifier = Identifier(**identifier_data)
+    # One statement against the unique rfid index: no check-then-insert race
+    statement = insert(Identifier).values(new_identifier.model_dump())
+    if replace:
+        # Re-registering updates in place; the stored access and photo are kept unless new ones were sent
+        statement = statement.on_conflict_do_update(
+            index_elements=[Identifier.rfid],
+            set_={key: statement.excluded[key] for key in identifier_data if key != "rfid"},
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=[Identifier.rfid])
 
-    if existing:
+    try:
+        saved = (await db.exec(statement.returning(Identifier))).scalar()
+        if saved is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Identifier with RFID {rfid} already exists"
+            )
+        identifier = saved.model_dump()
+        await db.commit()
+    except BaseException:
+        if pending_image:
+            await run_in_threadpool(pending_image.discard)
+        raise
+    identifiers_added([rfid])
+    action = "created" if saved.id == new_identifier.id else "updated"
+    event_broker.publish("identifier", {"action": action, "identifier": identifier})
+
+    # Only committed identifiers get their photo moved into place
+    if pending_image:
+        file_path = await run_in_threadpool(pending_image.publish)
+        background_tasks.add_task(generate_variants, file_path)
+    return identifier
+
+
+@app.get("/images/{filename}")
+async def identifier_image(
+        filename: str,
+        request: Request,
+        background_tasks: BackgroundTasks,
+        size: Optional[int] = Query(None, ge=1),
+):
+    source = image_file(filename)
+    if Path(filename).name != filename or not source.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    path, media_type = source, None
+    if size:
+        variant = find_variant(filename, size)
+        if variant:
+            path, media_type = variant, VARIANT_MEDIA_TYPES[IMAGE_VARIANT_FORMAT]
+        elif size <= max(IMAGE_VARIANT_SIZES):
+            # Uploaded before variants existed, or still being generated
+            background_tasks.add_task(generate_variants, source)
+
+    headers = {"cache-control": IMAGE_CACHE_CONTROL}
+    if content_hash(filename):
+        # The name already is the content hash, a stronger validator than mtime and size
+        headers = {"cache-control": IMMUTABLE_CACHE_CONTROL, "etag": f'"{path.name}"'}
+
+    stat_result = await run_in_threadpool(os.stat, path)
+    response = FileResponse(path, media_type=media_type, stat_result=stat_result, headers=headers)
+    if is_not_modified(request.headers, response.headers):
+        return not_modified(response.headers)
+    return response
+
+
+def collect_image_garbage() -> dict:
+    with Session(engine) as db:
+        paths = db.exec(select(Identifier.image_path).where(Identifier.image_path != None))
+        referenced = {path.rsplit("/", 1)[-1] for path in paths}
+    return collect_garbage(referenced)
+
+
+async def image_gc_loop():
+    while True:
+        await asyncio.sleep(IMAGE_GC_INTERVAL_SECONDS)
+        try:
+            result = await run_in_threadpool(collect_image_garbage)
+            print(f"Image GC removed {result['removed']} files ({result['freed_bytes']} bytes)")
+        except Exception as e:
+            print(f"Image GC failed: {e}")
+
+
+@app.post("/images/gc")
+async def run_image_gc(admin_user: User = Depends(get_admin_user)):
+    return await run_in_threadpool(collect_image_garbage)
+
+
+def identifiers_added(rfids: List[str]):
+    for rfid in rfids:
+        identifier_cache.invalidate(rfid)
+        unknown_rfid_cache.invalidate(rfid)
+        rfid_filter.add(rfid)
+    # Desktops drop whatever they cached for these cards, including "not found"
+    event_broker.publish("invalidate", {"rfids": rfids})
+
+
+@app.post("/identifiers/import", response_model=ImportReport)
+async def import_identifiers_file(
+        file: UploadFile = File(...),
+        file_format: Optional[str] = Form(None, alias="format"),
+        admin_user: User = Depends(get_admin_user),
+):
+    try:
+        fmt = file_format or detect_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if fmt not in IMPORT_FORMATS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Identifier with RFID {rfid} already exists"
+            detail=f"Unsupported import format {fmt}, use one of {IMPORT_FORMATS}"
         )
 
-    identifier_data = {"rfid": rfid, "name": name, "access": access}
+    # Parsing and bulk inserts are blocking; keep them off the event loop
+    return await run_in_threadpool(import_identifiers, file.file, fmt, identifiers_added)
 
-    if image and image.filename:
-        # Generate unique filename
-        filename = f"{uuid.uuid4()}_{image.filename}"
-        file_path = Path(f"static/images/{filename}")
 
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
+@app.get("/cache/stats")
+async def cache_stats(admin_user: User = Depends(get_admin_user)):
+    return {
+        "identifier": identifier_cache.stats(),
+        "unknown_rfid": unknown_rfid_cache.stats(),
+        "rfid_filter": rfid_filter.stats(),
+        "principal": principal_cache.stats(),
+    }
 
-        identifier_data["image_path"] = f"/static/images/{filename}"
 
-    new_identifier = Identifier(**identifier_data)
-    db.add(new_identifier)
-    db.commit()
-    db.refresh(new_identifier)
-    return new_identifier
+@app.get("/metrics", include_in_schema=False)
+async def metrics(api_key: Optional[str] = Depends(metrics_key_header)):
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if METRICS_API_KEY and not hmac.compare_digest(api_key or "", METRICS_API_KEY):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid API key")
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/events")
+async def events(current_user: User = Depends(get_current_user)):
+    try:
+        subscription = event_broker.subscribe()
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return StreamingResponse(
+        event_stream(event_broker, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/passes", response_model=PassPage)
+async def list_passes(
+        rfid: Optional[str] = None,
+        name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=500),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    statement = (
+        select(PassRegister.id, PassRegister.rfid, PassRegister.date, Identifier.name)
+        .join(Identifier, Identifier.rfid == PassRegister.rfid, isouter=True)
+    )
+
+    if rfid:
+        statement = statement.where(PassRegister.rfid == rfid)
+    if name:
+        statement = statement.where(Identifier.name.contains(name))
+    if since:
+        statement = statement.where(PassRegister.date >= since)
+    if until:
+        statement = statement.where(PassRegister.date < until)
+    if cursor:
+        try:
+            cursor_date, cursor_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        statement = statement.where(tuple_(PassRegister.date, PassRegister.id) < (cursor_date, cursor_id))
+
+    # Newest first; fetch one extra row to know whether another page exists
+    statement = statement.order_by(PassRegister.date.desc(), PassRegister.id.desc()).limit(limit + 1)
+    rows = (await db.exec(statement)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+
+    return {"items": [row._asdict() for row in rows], "next_cursor": next_cursor}
+
+
+@app.get("/stats", response_model=PassStats)
+async def pass_stats(
+        day: Optional[date] = None,
+        rfid: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+):
+    day_key = (day or date.today()).isoformat()
+    keys = [("total", ""), ("day", day_key)]
+    if rfid:
+        keys.append(("card", rfid))
+
+    # Counters are maintained by the pass log writer, so every read is a primary-key lookup
+    statement = select(PassStat).where(or_(
+        *((PassStat.period == period) & (PassStat.key == key) for period, key in keys),
+        (PassStat.period == "hour") & (PassStat.key >= f"{day_key}T") & (PassStat.key < f"{day_key}U"),
+    ))
+    counters = {(stat.period, stat.key): stat for stat in await db.exec(statement)}
+
+    def counts(period_key):
+        stat = counters.get(period_key)
+        return {"granted": stat.granted, "denied": stat.denied} if stat else {"granted": 0, "denied": 0}
+
+    return {
+        "total": counts(("total", "")),
+        "day": day_key,
+        "today": counts(("day", day_key)),
+        "hours": {
+            key[len(day_key) + 1:]: counts((period, key))
+            for period, key in sorted(counters) if period == "hour"
+        },
+        "card": counts(("card", rfid)) if rfid else None,
+    }
+
+
+def export_response(statement, columns: List[str], fmt: str, name: str):
+    return StreamingResponse(
+        export_rows(statement, columns, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@app.get("/identifiers/export")
+async def export_identifiers(
+        file_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+        admin_user: User = Depends(get_admin_user),
+):
+    columns = ["id", "rfid", "name", "access", "image_path"]
+    statement = select(*(getattr(Identifier, column) for column in columns))
+    return export_response(statement, columns, file_format, "identifiers")
+
+
+@app.get("/passes/export")
+async def export_passes(
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        file_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+        admin_user: User = Depends(get_admin_user),
+):
+    columns = ["id", "rfid", "date", "granted"]
+    statement = select(*(getattr(PassRegister, column) for column in columns)).order_by(PassRegister.date)
+    if since:
+        statement = statement.where(PassRegister.date >= since)
+    if until:
+        statement = statement.where(PassRegister.date < until)
+    return export_response(statement, columns, file_format, "passes")